@@ -0,0 +1,274 @@
+#!/usr/bin/python
+# benchmark.py
+# Banco de pruebas reproducible: genera un corpus .rpy sintético y mide el pipeline completo
+# (parseo -> idioma -> tokenización -> generate -> decodificación -> escritura).
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import resource
+import tempfile
+
+from main import translate_files, load_translation_model
+from pipeline import translate_files_pipelined
+from language_id import LanguageIdentifier
+from pipeline_stats import PipelineStats
+from inference_backends import BACKENDS
+
+SUBJECTS = ["I", "You", "We", "They", "She", "He", "The teacher", "My sister", "Your friend", "Everyone"]
+VERBS = ["want to see", "can't believe", "remember", "forgot about", "need to talk about", "really like", "saw", "found"]
+OBJECTS = ["the festival", "that old house", "the letter", "your brother", "the beach", "this place", "the answer", "the train"]
+ENDINGS = [".", "!", "?", "...", " tonight.", " again.", " right now!", " before it's too late."]
+SHORT_LINES = ["...", "Yes.", "No.", "Huh?", "Wait!", "Okay.", "Thanks.", "What?", "Hey!", "Sorry."]
+CHARACTERS = ["e", "mc", "s", "m", "n"]
+
+def make_sentence(rng):
+    return f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)}{rng.choice(ENDINGS)}"
+
+def decorate(sentence, rng):
+    """Añade marcado de Ren'Py a algunas frases: variables, etiquetas y colores."""
+    roll = rng.random()
+    if roll < 0.08:
+        return f"[player_name], {sentence[0].lower()}{sentence[1:]}"
+    if roll < 0.14:
+        words = sentence.split()
+        words[-1] = "{b}" + words[-1] + "{/b}"
+        return " ".join(words)
+    if roll < 0.20:
+        words = sentence.split()
+        words[0] = "<color=#ff6666>" + words[0] + "</color>"
+        return " ".join(words)
+    return sentence
+
+def generate_corpus(folder, files=10, lines_per_file=1000, repetition_rate=0.3, seed=0):
+    """Escribe un corpus sintético pero realista y devuelve la lista de archivos."""
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    used = []
+    file_paths = []
+    for file_number in range(files):
+        lines = [f"# Synthetic script {file_number}\n", f"label chapter_{file_number}:\n"]
+        while len(lines) < lines_per_file:
+            roll = rng.random()
+            if used and rng.random() < repetition_rate:
+                text = rng.choice(used)
+            elif roll < 0.15:
+                text = rng.choice(SHORT_LINES)
+            else:
+                text = decorate(make_sentence(rng), rng)
+                used.append(text)
+
+            kind = rng.random()
+            if kind < 0.08:
+                lines.append(f"translate CUSTOM line_{file_number}_{len(lines)}:\n")
+                lines.append(f'    "{text}"\n')
+            elif kind < 0.14:
+                lines.append("    menu:\n")
+                lines.append(f'        "{make_sentence(rng)}":\n')
+                lines.append(f"            jump choice_{len(lines)}\n")
+            elif kind < 0.20:
+                lines.append(f"    show {rng.choice(CHARACTERS)} happy\n")
+            elif kind < 0.25:
+                lines.append(f'    "{text}"\n')
+            else:
+                lines.append(f'    {rng.choice(CHARACTERS)} "{text}"\n')
+
+        file_path = os.path.join(folder, f"script_{file_number:03d}.rpy")
+        with open(file_path, 'w', encoding='utf-8') as file:
+            file.writelines(lines)
+        file_paths.append(file_path)
+    return file_paths
+
+class StandInEncoding(dict):
+    def to(self, device):
+        return self
+
+class StandInTokenizer:
+    """Tokenizador de juguete (palabras -> ids) con la misma interfaz que el de transformers."""
+    pad_token_id = 0
+
+    def __init__(self):
+        self.vocab = {"<pad>": 0}
+        self.words = ["<pad>"]
+
+    def encode_words(self, text):
+        ids = []
+        for word in text.split():
+            if word not in self.vocab:
+                self.vocab[word] = len(self.words)
+                self.words.append(word)
+            ids.append(self.vocab[word])
+        return ids
+
+    def __call__(self, texts, return_tensors=None, padding=False):
+        if isinstance(texts, str):
+            texts = [texts]
+        encoded = [self.encode_words(text) or [0] for text in texts]
+        width = max(len(ids) for ids in encoded)
+        return StandInEncoding(
+            input_ids=[ids + [0] * (width - len(ids)) for ids in encoded],
+            attention_mask=[[1] * len(ids) + [0] * (width - len(ids)) for ids in encoded],
+        )
+
+    def batch_decode(self, sequences, skip_special_tokens=True):
+        return [" ".join(self.words[i] for i in ids if i) for ids in sequences]
+
+    def decode(self, ids, skip_special_tokens=True):
+        return self.batch_decode([ids])[0]
+
+class StandInModel:
+    """Modelo de juguete: devuelve la entrada tal cual, con un coste opcional por token."""
+    name_or_path = "standin"
+
+    def __init__(self, seconds_per_token=0.0):
+        self.seconds_per_token = seconds_per_token
+
+    def generate(self, input_ids=None, attention_mask=None, **kwargs):
+        if self.seconds_per_token:
+            time.sleep(self.seconds_per_token * sum(sum(mask) for mask in attention_mask) * kwargs.get('num_beams', 1))
+        return [[i for i, keep in zip(ids, mask) if keep] for ids, mask in zip(input_ids, attention_mask)]
+
+class TimedModel:
+    """Envuelve el modelo para medir la latencia por fragmento de cada lote."""
+
+    def __init__(self, model, latencies):
+        self.model = model
+        self.latencies = latencies
+        self.name_or_path = getattr(model, 'name_or_path', type(model).__name__)
+
+    def generate(self, **kwargs):
+        start = time.perf_counter()
+        outputs = self.model.generate(**kwargs)
+        if hasattr(outputs, 'device') and outputs.device.type == 'cuda':
+            import torch
+            torch.cuda.synchronize()
+        elapsed = time.perf_counter() - start
+        batch_size = len(kwargs['input_ids'])
+        self.latencies.extend([elapsed / batch_size] * batch_size)
+        return outputs
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux da KB y macOS bytes
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+def run_benchmark(model_name="standin", device="cpu", files=10, lines_per_file=1000, repetition_rate=0.3, seed=0,
+                  batch_size=16, max_length=512, num_beams=4, seconds_per_token=0.0, quantized=False, max_tokens=None, pipelined=False, adaptive=False,
+                  backend="torch"):
+    workdir = tempfile.mkdtemp(prefix="traductor-bench-")
+    try:
+        file_paths = generate_corpus(os.path.join(workdir, "corpus"), files, lines_per_file, repetition_rate, seed)
+        corpus_bytes = sum(os.path.getsize(file_path) for file_path in file_paths)
+        corpus_lines = 0
+        for file_path in file_paths:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                corpus_lines += sum(1 for _ in file)
+        output_paths = {file_path: os.path.join(workdir, "out", os.path.basename(file_path)) for file_path in file_paths}
+
+        load_start = time.perf_counter()
+        if model_name == "standin":
+            tokenizer, model = StandInTokenizer(), StandInModel(seconds_per_token)
+        else:
+            tokenizer, model = load_translation_model(model_name, device, quantized, backend=backend)
+        load_seconds = time.perf_counter() - load_start
+
+        stats = PipelineStats()
+        latencies = []
+        language_id = LanguageIdentifier("es")
+
+        start = time.perf_counter()
+        run = translate_files_pipelined if pipelined else translate_files
+        report = run(
+            file_paths, tokenizer, TimedModel(model, latencies), device,
+            max_length, num_beams, 1.0, 1.2, 1.0, 0, None,
+            batch_size=batch_size, language_id=language_id, output_paths=output_paths, stats=stats, max_tokens=max_tokens,
+            adaptive=adaptive
+        )
+        seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    counters = stats.counters
+    tokens = counters['tokens_in'] + counters['tokens_out']
+    return {
+        'model': model_name,
+        'device': device,
+        'quantized': quantized,
+        'backend': backend,
+        'corpus': {'files': files, 'lines_per_file': lines_per_file, 'repetition_rate': repetition_rate,
+                   'seed': seed, 'bytes': corpus_bytes},
+        'settings': {'batch_size': batch_size, 'max_length': max_length, 'num_beams': num_beams, 'max_tokens': max_tokens,
+                     'pipelined': pipelined, 'adaptive': adaptive},
+        'load_seconds': load_seconds,
+        'seconds': seconds,
+        'lines': corpus_lines,
+        'translatable_lines': report['lines_total'],
+        'segments': report['unique'],
+        'tokens_in': counters['tokens_in'],
+        'tokens_out': counters['tokens_out'],
+        'lines_per_sec': corpus_lines / seconds if seconds else 0.0,
+        'tokens_per_sec': tokens / seconds if seconds else 0.0,
+        'segment_latency_ms': {'p50': percentile(latencies, 0.50) * 1000, 'p95': percentile(latencies, 0.95) * 1000},
+        'stage_seconds': dict(stats.seconds),
+        'counters': dict(counters),
+        'padding_efficiency': stats.snapshot()['padding_efficiency'],
+        'decoding_work_saved_percent': stats.snapshot()['decoding_work_saved_percent'],
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+def compare(old_path, new_path):
+    """Compara dos resultados guardados y muestra el cambio en las métricas principales."""
+    with open(old_path, 'r', encoding='utf-8') as file:
+        old = json.load(file)
+    with open(new_path, 'r', encoding='utf-8') as file:
+        new = json.load(file)
+    for key in ('lines_per_sec', 'tokens_per_sec', 'seconds', 'peak_rss_mb'):
+        change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+        print(f"{key:>16}: {old[key]:12.2f} -> {new[key]:12.2f} ({change:+.1f}%)")
+    for key in ('p50', 'p95'):
+        old_value, new_value = old['segment_latency_ms'][key], new['segment_latency_ms'][key]
+        print(f"{key + ' latency ms':>16}: {old_value:12.3f} -> {new_value:12.3f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Reproducible translation benchmark on a synthetic Ren'Py corpus")
+    parser.add_argument("--model", default="standin", help="'standin' (tiny local fake model) or a Helsinki-NLP model name")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--quantized", action="store_true")
+    parser.add_argument("--backend", default="torch", choices=sorted(BACKENDS),
+                        help="Inference backend for a real model; run once per backend with --output and --compare them")
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--lines", type=int, default=1000, help="Lines per file")
+    parser.add_argument("--repetition", type=float, default=0.3, help="Probability of repeating an earlier line")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--num-beams", type=int, default=4)
+    parser.add_argument("--max-tokens", type=int, default=0, help="Token budget per batch (0 = fixed batch size)")
+    parser.add_argument("--pipelined", action="store_true", help="Use the overlapped pipeline (pipeline.py)")
+    parser.add_argument("--adaptive", action="store_true", help="Adapt beams and max_length to each segment (decoding_policy.py)")
+    parser.add_argument("--standin-cost", type=float, default=0.0, help="Simulated seconds per token for the stand-in model")
+    parser.add_argument("--output", help="Write the JSON result to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two saved results")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+
+    result = run_benchmark(args.model, args.device, args.files, args.lines, args.repetition, args.seed,
+                           args.batch_size, args.max_length, args.num_beams, args.standin_cost, args.quantized, args.max_tokens,
+                           args.pipelined, args.adaptive, args.backend)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
@@ -0,0 +1,188 @@
+#!/usr/bin/python
+# cli.py
+# Traducción sin interfaz: para servidores, máquinas de render o cron. No importa PyQt.
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+
+from main import DEFAULT_LANGUAGE_ID, translate_files, load_translation_model
+from pipeline import translate_files_pipelined
+from model_registry import ModelRegistry, DEFAULT_BUDGET_MB, translate_files_by_language
+from inference_backends import BACKENDS, DEFAULT_BACKEND
+from translation_memory import TranslationMemory, DEFAULT_MEMORY_PATH
+from project_index import ProjectIndex, project_folder
+from translation_server import TranslationClient, DEFAULT_SERVER_URL
+
+def find_rpy_files(paths):
+    """Acepta carpetas (se recorren enteras), patrones glob o archivos sueltos."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files_in_dir in os.walk(path):
+                files.extend(os.path.join(root, file) for file in sorted(files_in_dir) if file.endswith('.rpy'))
+        elif any(character in path for character in '*?['):
+            files.extend(sorted(file for file in glob.glob(path, recursive=True) if file.endswith('.rpy')))
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            raise FileNotFoundError(f"No such file or folder: {path}")
+    return list(dict.fromkeys(os.path.abspath(file) for file in files))
+
+def output_paths_for(file_paths, output_dir):
+    """Mismo árbol de carpetas que los originales, pero dentro de output_dir."""
+    base = project_folder(file_paths)
+    return {file_path: os.path.join(output_dir, os.path.relpath(file_path, base)) for file_path in file_paths}
+
+def emit(event, **fields):
+    # Una línea JSON por evento en stdout, fácil de leer desde otro programa
+    print(json.dumps({'event': event, **fields}, ensure_ascii=False), flush=True)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Translate Ren'Py .rpy files without the GUI")
+    parser.add_argument("paths", nargs="+", help="Folders, glob patterns (e.g. 'game/tl/**/*.rpy') or files")
+    parser.add_argument("--model", default="Helsinki-NLP/opus-mt-en-es")
+    parser.add_argument("--device", default="cuda", help="cuda or cpu")
+    parser.add_argument("--quantized", action="store_true", help="Use the int8 copy of the model (CPU only)")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=sorted(BACKENDS),
+                        help="Inference backend; onnx exports the model once and runs it with ONNX Runtime")
+    parser.add_argument("--workers", type=int, default=0, help="CPU worker processes (0 = single process)")
+    parser.add_argument("--server", nargs="?", const=DEFAULT_SERVER_URL,
+                        help=f"Use a running translation_server.py instead of loading the model (default {DEFAULT_SERVER_URL})")
+    parser.add_argument("--auto-model", action="store_true",
+                        help="Detect each file's source language and use the matching Helsinki-NLP model (--model is the fallback)")
+    parser.add_argument("--model-budget-mb", type=int, default=DEFAULT_BUDGET_MB,
+                        help="Most memory used by models loaded at once with --auto-model (0 = no limit)")
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--num-beams", type=int, default=4)
+    parser.add_argument("--temperature", type=float, default=1.0)
+    parser.add_argument("--repetition-penalty", type=float, default=1.2)
+    parser.add_argument("--length-penalty", type=float, default=1.0)
+    parser.add_argument("--no-repeat-ngram-size", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=16, help="Most segments per batch")
+    parser.add_argument("--max-tokens", type=int, default=16000,
+                        help="Token budget per batch (input x beams x expected output); 0 = fixed --batch-size batches")
+    parser.add_argument("--adaptive-decoding", action="store_true",
+                        help="Adapt beams and max_length to each segment's length instead of using --num-beams and --max-length for all")
+    parser.add_argument("--no-masking", action="store_true",
+                        help="Translate tagged lines fragment by fragment instead of masking [var]/{tag}/<html> markup")
+    parser.add_argument("--no-pipeline", action="store_true",
+                        help="Read every file first and translate afterwards, instead of overlapping reading, translation and writing")
+    parser.add_argument("--output-mode", choices=["inplace", "copy"], default="inplace",
+                        help="inplace overwrites the files (like the GUI), copy writes them under --output-dir")
+    parser.add_argument("--output-dir", help="Destination folder for --output-mode copy")
+    parser.add_argument("--memory", default=DEFAULT_MEMORY_PATH, help="Translation memory database")
+    parser.add_argument("--no-memory", action="store_true", help="Do not use the translation memory")
+    parser.add_argument("--no-index", action="store_true", help="Do not reuse lines from the project index")
+    parser.add_argument("--stats-file", help="Dump per-stage timings and counters here after each file (.json, or .prom for Prometheus)")
+    parser.add_argument("--progress-interval", type=float, default=1.0, help="Seconds between progress events")
+    args = parser.parse_args(argv)
+    if args.output_mode == "copy" and not args.output_dir:
+        parser.error("--output-mode copy needs --output-dir")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    start_time = time.monotonic()
+    try:
+        file_paths = find_rpy_files(args.paths)
+        if not file_paths:
+            emit("error", message="No .rpy files found")
+            return 2
+
+        device = "cpu" if args.quantized else args.device
+        pool = None
+        if args.server:
+            # El servicio ya tiene el modelo cargado y junta nuestros lotes con los de otros clientes
+            tokenizer, model = None, None
+            pool = TranslationClient(args.server, args.model, args.quantized).load()
+        else:
+            tokenizer, model = load_translation_model(args.model, device, args.quantized, backend=args.backend)
+        emit("ready", files=len(file_paths), model=args.model, device=device, server=args.server, backend=args.backend,
+             load_seconds=time.monotonic() - start_time)
+
+        if pool is None and args.workers > 0 and device == "cpu":
+            from cpu_pool import CpuTranslationPool
+            pool = CpuTranslationPool(args.model, args.workers, quantized=args.quantized, backend=args.backend)
+
+        memory = None if args.no_memory else TranslationMemory(args.memory)
+        output_paths = output_paths_for(file_paths, args.output_dir) if args.output_mode == "copy" else None
+        index = None
+        if not args.no_index:
+            # En modo copia el índice va con la traducción y no se toca el árbol de origen
+            index_folder = project_folder(output_paths.values() if output_paths else file_paths)
+            os.makedirs(index_folder, exist_ok=True)
+            index = ProjectIndex(index_folder)
+
+        translate_start = time.monotonic()
+        last_emit = [0.0]
+
+        def report_progress(info):
+            now = time.monotonic()
+            if now - last_emit[0] < args.progress_interval and info['segments_done'] < info['segments_total']:
+                return
+            last_emit[0] = now
+            emit("progress", elapsed=now - translate_start, **info)
+
+        run = translate_files if args.no_pipeline else translate_files_pipelined
+        try:
+            if args.auto_model and pool is None:
+                registry = ModelRegistry(device, args.quantized, args.model_budget_mb, backend=args.backend)
+                registry.add(args.model, tokenizer, model)
+                report = translate_files_by_language(
+                    run, file_paths, registry, DEFAULT_LANGUAGE_ID, args.model, progress_callback=report_progress,
+                    warning_callback=lambda model, error, files: emit(
+                        "warning", message=f"{model} could not be loaded, using {args.model}", error=error, files=files),
+                    device=device, max_length=args.max_length, num_beams=args.num_beams, temperature=args.temperature,
+                    repetition_penalty=args.repetition_penalty, length_penalty=args.length_penalty,
+                    no_repeat_ngram_size=args.no_repeat_ngram_size, batch_size=args.batch_size, max_tokens=args.max_tokens,
+                    masking=not args.no_masking, adaptive=args.adaptive_decoding, memory=memory, index=index,
+                    output_paths=output_paths, stats_path=args.stats_file
+                )
+            else:
+                report = run(
+                    file_paths, tokenizer, model, device,
+                    args.max_length, args.num_beams, args.temperature, args.repetition_penalty,
+                    args.length_penalty, args.no_repeat_ngram_size, report_progress,
+                    batch_size=args.batch_size, max_tokens=args.max_tokens, masking=not args.no_masking,
+                    adaptive=args.adaptive_decoding, memory=memory, pool=pool,
+                    model_name=f"{args.model}:int8" if args.quantized else args.model,
+                    index=index, output_paths=output_paths, stats_path=args.stats_file
+                )
+        finally:
+            if pool is not None:
+                pool.shutdown()
+    except Exception as e:
+        emit("error", message=str(e), type=type(e).__name__)
+        return 2
+
+    elapsed = time.monotonic() - translate_start
+    emit(
+        "summary",
+        files=report['files'],
+        lines_total=report['lines_total'],
+        lines_done=report['lines_done'],
+        reused_lines=report['reused_lines'],
+        unique_segments=report['unique'],
+        dedup_saved=report['saved'],
+        errors=report['errors'],
+        seconds=elapsed,
+        total_seconds=time.monotonic() - start_time,
+        lines_per_sec=report['lines_done'] / elapsed if elapsed else 0.0,
+        segments_per_sec=report['unique'] / elapsed if elapsed else 0.0,
+        memory=memory.stats() if memory is not None else None,
+        server=pool.stats() if args.server else None,
+        stages=report['stats']['seconds'],
+        counters=report['stats']['counters'],
+        padding_efficiency=report['stats']['padding_efficiency'],
+        decoding_work_saved_percent=report['stats']['decoding_work_saved_percent'],
+        models=report.get('models'),
+        model_fallbacks=report.get('fallbacks'),
+        registry=report.get('registry'),
+    )
+    return 1 if report['errors'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+#!/usr/bin/python
+# cpu_pool.py
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Estado de cada proceso: el modelo se carga una sola vez en el inicializador
+_worker_state = {}
+
+def default_threads_per_worker(workers):
+    """Reparte los núcleos de la máquina entre los procesos para no sobresuscribir la CPU."""
+    return max(1, (os.cpu_count() or 1) // workers)
+
+def _init_worker(model_name, threads, quantized, backend="torch"):
+    if backend == "torch":
+        import torch
+        torch.set_num_interop_threads(1)
+
+    from inference_backends import get_backend
+    _worker_state['tokenizer'], _worker_state['model'] = get_backend(backend).load(model_name, "cpu", quantized, threads=threads)
+
+def _translate_batch(texts, generation_kwargs):
+    from main import generate_batch
+    return generate_batch(texts, _worker_state['tokenizer'], _worker_state['model'], "cpu", generation_kwargs)
+
+class CpuTranslationPool:
+    """Pool de procesos que traduce lotes en CPU, cada proceso con su copia del modelo.
+
+    Los lotes se reciben ya formados y se devuelven en el mismo orden, así que
+    el resultado es el mismo que traduciendo los lotes en un solo proceso.
+    """
+
+    def __init__(self, model_name, workers, threads_per_worker=None, quantized=False, backend="torch"):
+        self.model_name = model_name
+        self.workers = workers
+        self.quantized = quantized
+        self.backend = backend
+        self.threads_per_worker = threads_per_worker or default_threads_per_worker(workers)
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, self.threads_per_worker, quantized, backend)
+        )
+
+    def translate_batches(self, batches, generation_kwargs, should_stop=None):
+        """Envía todos los lotes al pool y devuelve (lote, traducciones o excepción) en orden."""
+        futures = [self.executor.submit(_translate_batch, batch, generation_kwargs) for batch in batches]
+        try:
+            for batch, future in zip(batches, futures):
+                if should_stop and should_stop():
+                    return
+                try:
+                    yield batch, future.result()
+                except Exception as e:
+                    yield batch, e
+        finally:
+            # Los lotes que aún no han empezado se descartan al cancelar
+            for future in futures:
+                future.cancel()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,161 @@
+#!/usr/bin/python
+# decoding_policy.py
+# Ajustes de generate por fragmento: los textos cortos van con búsqueda voraz o pocos haces y
+# max_length sale del tamaño de la entrada, en lugar de usar los mismos valores para todo.
+import sys
+import time
+import argparse
+
+from main import batch_token_cost, estimate_tokens, make_batches, generate_batch
+
+# Hasta este número de tokens un fragmento va sin haces ("Okay.", "Huh?")
+GREEDY_TOKENS = 6
+# Hasta este, con REDUCED_BEAMS haces; los más largos con todos los del usuario
+REDUCED_TOKENS = 16
+REDUCED_BEAMS = 2
+# max_length = tokens de entrada (redondeados a potencia de 2) x este margen, nunca menos de MIN_MAX_LENGTH
+MAX_LENGTH_RATIO = 4
+MIN_MAX_LENGTH = 32
+# Ni, pase lo que pase, menos de este múltiplo de la entrada real
+MIN_OUTPUT_RATIO = 2
+POLICIES = ('greedy', 'reduced', 'full')
+
+def length_bucket(tokens):
+    """Potencia de 2 que cubre tokens (mínimo 8), para que los fragmentos parecidos compartan ajustes."""
+    bucket = 8
+    while bucket < tokens:
+        bucket *= 2
+    return bucket
+
+def token_counts(texts, tokenizer=None):
+    """Tokens de entrada de cada texto según el tokenizador del modelo.
+
+    Sin tokenizador (p. ej. con --server) se cuenta un token por carácter: nunca
+    se queda corto, también con chino o japonés, y como mucho se usan más haces
+    de los necesarios.
+    """
+    if tokenizer is None:
+        return [len(text) + 1 for text in texts]
+    return [len(ids) for ids in tokenizer(texts)['input_ids']]
+
+def choose_policy(text, generation_kwargs, tokens=None):
+    """Devuelve (nombre de la política, generation_kwargs para este texto).
+
+    tokens es la longitud real de la entrada (ver token_counts); sin ella se estima.
+    """
+    tokens = estimate_tokens(text) if tokens is None else tokens
+    num_beams = generation_kwargs.get('num_beams', 1)
+    if tokens <= GREEDY_TOKENS:
+        policy, num_beams = 'greedy', 1
+    elif tokens <= REDUCED_TOKENS:
+        policy, num_beams = 'reduced', min(num_beams, REDUCED_BEAMS)
+    else:
+        policy = 'full'
+    max_length = generation_kwargs.get('max_length', 512)
+    kwargs = dict(generation_kwargs)
+    kwargs['num_beams'] = num_beams
+    kwargs['max_length'] = min(max_length, max(MIN_MAX_LENGTH, length_bucket(tokens) * MAX_LENGTH_RATIO, tokens * MIN_OUTPUT_RATIO))
+    return policy, kwargs
+
+def decoding_groups(texts, generation_kwargs, tokenizer=None):
+    """Agrupa los textos por ajustes de generate, conservando el orden en que aparece cada grupo.
+
+    Las longitudes salen de tokenizer (ver token_counts). Devuelve una lista de
+    (política, generation_kwargs, textos, tokens de cada texto); cada grupo se
+    traduce con sus propios lotes.
+    """
+    groups = {}
+    for text, tokens in zip(texts, token_counts(texts, tokenizer)):
+        policy, kwargs = choose_policy(text, generation_kwargs, tokens)
+        key = (policy, kwargs['num_beams'], kwargs['max_length'])
+        if key not in groups:
+            groups[key] = (policy, kwargs, [], [])
+        groups[key][2].append(text)
+        groups[key][3].append(tokens)
+    return list(groups.values())
+
+def decode_cost(tokens, generation_kwargs):
+    """Trabajo estimado del decodificador (tokens x haces) con unos ajustes, a partir de los
+    mismos recuentos de tokens con los que se eligió la política."""
+    return sum(
+        batch_token_cost(1, count, generation_kwargs.get('num_beams', 1), generation_kwargs.get('max_length', 512))
+        for count in tokens
+    )
+
+def record_policy(stats, policy, tokens, policy_kwargs, generation_kwargs):
+    stats.add(f'{policy}_segments', len(tokens))
+    stats.add('baseline_decode_tokens', decode_cost(tokens, generation_kwargs))
+    stats.add('policy_decode_tokens', decode_cost(tokens, policy_kwargs))
+
+def compare_policies(texts, tokenizer, model, device, generation_kwargs, batch_size=16):
+    """Traduce los mismos textos con los ajustes fijos y con la política, y compara tiempo y resultado.
+
+    La salida con ajustes fijos hace de referencia: 100 de BLEU/chrF significa
+    que la política no cambia nada.
+    """
+    from metrics import corpus_bleu, corpus_chrf
+    outputs = {}
+    seconds = {}
+    policy_seconds = {policy: 0.0 for policy in POLICIES}
+    adaptive_groups = decoding_groups(texts, generation_kwargs, tokenizer)
+    for mode in ('fixed', 'adaptive'):
+        if mode == 'fixed':
+            groups = [('fixed', generation_kwargs, texts, None)]
+        else:
+            groups = adaptive_groups
+        translations = {}
+        start = time.perf_counter()
+        for policy, kwargs, group, _ in groups:
+            group_start = time.perf_counter()
+            for batch in make_batches(group, batch_size):
+                translations.update(zip(batch, generate_batch(batch, tokenizer, model, device, kwargs)))
+            if mode == 'adaptive':
+                policy_seconds[policy] += time.perf_counter() - group_start
+        seconds[mode] = time.perf_counter() - start
+        outputs[mode] = [translations[text] for text in texts]
+
+    policies = {policy: 0 for policy in POLICIES}
+    for policy, _, group, _ in adaptive_groups:
+        policies[policy] += len(group)
+    tokens = [count for _, _, _, counts in adaptive_groups for count in counts]
+    return {
+        'segments': len(texts),
+        'policies': policies,
+        'fixed_seconds': seconds['fixed'],
+        'adaptive_seconds': seconds['adaptive'],
+        'speedup': seconds['fixed'] / seconds['adaptive'] if seconds['adaptive'] else 0.0,
+        # Tiempo medido de cada política frente al trabajo estimado (tokens x haces) que se ahorra
+        'policy_seconds': policy_seconds,
+        'estimated_work_saved_percent': (1 - sum(decode_cost(counts, kwargs) for _, kwargs, _, counts in adaptive_groups)
+                                         / max(decode_cost(tokens, generation_kwargs), 1)) * 100,
+        'changed_segments': sum(1 for fixed, adaptive in zip(outputs['fixed'], outputs['adaptive']) if fixed != adaptive),
+        'bleu_vs_fixed': corpus_bleu(outputs['adaptive'], outputs['fixed']),
+        'chrf_vs_fixed': corpus_chrf(outputs['adaptive'], outputs['fixed']),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare adaptive decoding against fixed generate settings on real .rpy lines")
+    parser.add_argument("files", nargs="+", metavar="RPY")
+    parser.add_argument("--model", default="Helsinki-NLP/opus-mt-en-es")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--num-beams", type=int, default=4)
+    args = parser.parse_args()
+
+    from main import load_translation_model, make_generation_kwargs
+    from model_installer import sample_rpy_texts
+    texts = sample_rpy_texts(args.files, args.samples)
+    if not texts:
+        print("No translatable lines found.")
+        sys.exit(1)
+    tokenizer, model = load_translation_model(args.model, args.device)
+    generation_kwargs = make_generation_kwargs(args.max_length, args.num_beams, 1.0, 1.2, 1.0, 0)
+    report = compare_policies(texts, tokenizer, model, args.device, generation_kwargs, args.batch_size)
+    print(f"Segments: {report['segments']} ({', '.join(f'{count} {policy}' for policy, count in report['policies'].items())})")
+    print(f"Speed: fixed {report['fixed_seconds']:.2f}s, adaptive {report['adaptive_seconds']:.2f}s (x{report['speedup']:.2f}), "
+          f"estimated decoder tokens saved {report['estimated_work_saved_percent']:.0f}%")
+    print("Measured generate time per policy: " + ', '.join(f"{policy} {value:.2f}s" for policy, value in report['policy_seconds'].items()))
+    print(f"Quality vs fixed: BLEU {report['bleu_vs_fixed']:.1f}, chrF {report['chrf_vs_fixed']:.1f}, "
+          f"{report['changed_segments']} segments changed")
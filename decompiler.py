@@ -0,0 +1,194 @@
+#!/usr/bin/python
+# decompiler.py
+# Descompilación de .rpyc con unrpyc en paralelo, saltando los que ya se descompilaron.
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+UNRPYC_COMMAND = ['unrpyc']
+# Hash de cada .rpyc con el que se generó su .rpy, en la misma carpeta que los .rpy
+CACHE_FILE_NAME = ".traductor_unrpyc.json"
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def output_path_for(rpyc_path, destination=None, base=None):
+    """Dónde queda el .rpy: junto al .rpyc o, con destination, en la misma subcarpeta relativa a base."""
+    rpy_name = os.path.splitext(os.path.basename(rpyc_path))[0] + '.rpy'
+    if destination is None:
+        return os.path.join(os.path.dirname(rpyc_path), rpy_name)
+    folder = os.path.relpath(os.path.dirname(os.path.abspath(rpyc_path)), base) if base else ''
+    return os.path.normpath(os.path.join(destination, folder, rpy_name))
+
+def load_cache(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(path, cache):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(cache, file, indent=1)
+    os.replace(temp_path, path)
+
+class DecompileCache:
+    """Los archivos de caché de las carpetas de los .rpy, cargados al usarlos por primera vez.
+
+    Cada .rpy se busca siempre en el archivo de su propia carpeta, así que
+    decompile_files y stale_rpyc_files leen y escriben el mismo.
+    """
+
+    def __init__(self):
+        self.caches = {}
+        self.changed = set()
+        self.lock = threading.Lock()
+
+    def path_for(self, output_path):
+        return os.path.join(os.path.dirname(os.path.abspath(output_path)), CACHE_FILE_NAME)
+
+    def get(self, output_path):
+        path = self.path_for(output_path)
+        with self.lock:
+            if path not in self.caches:
+                self.caches[path] = load_cache(path)
+            return self.caches[path]
+
+    def record(self, output_path, digest):
+        cache = self.get(output_path)
+        with self.lock:
+            cache[os.path.abspath(output_path)] = digest
+            self.changed.add(self.path_for(output_path))
+
+    def save(self):
+        for path in self.changed:
+            save_cache(path, self.caches[path])
+        self.changed.clear()
+
+def is_up_to_date(rpyc_path, output_path, cache):
+    """Un .rpy vale si es más nuevo que su .rpyc o si se generó a partir de un .rpyc idéntico.
+
+    Devuelve (vale, hash del .rpyc o None si no hizo falta calcularlo).
+    """
+    if not os.path.exists(output_path):
+        return False, None
+    if os.path.getmtime(output_path) >= os.path.getmtime(rpyc_path):
+        return True, None
+    digest = file_hash(rpyc_path)
+    return cache.get(os.path.abspath(output_path)) == digest, digest
+
+def decompile_file(rpyc_path, output_path, command=UNRPYC_COMMAND):
+    """Descompila un .rpyc en output_path.
+
+    unrpyc siempre escribe junto al .rpyc, así que se trabaja sobre una copia
+    en una carpeta temporal y el resultado se mueve después al destino.
+    """
+    with tempfile.TemporaryDirectory(prefix="traductor-unrpyc-") as workdir:
+        copy_path = os.path.join(workdir, os.path.basename(rpyc_path))
+        shutil.copyfile(rpyc_path, copy_path)
+        subprocess.run(command + [copy_path], check=True, capture_output=True)
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        shutil.move(os.path.splitext(copy_path)[0] + '.rpy', output_path)
+
+def decompile_files(rpyc_paths, destination=None, workers=None, command=UNRPYC_COMMAND, force=False, progress_callback=None):
+    """Descompila varios .rpyc a la vez (cada uno en su propio proceso unrpyc).
+
+    Sin destination cada .rpy se escribe junto a su .rpyc; con destination se
+    conserva la estructura de carpetas. Los .rpyc cuyo .rpy ya está al día se
+    saltan salvo con force. progress_callback(hechos, total) se llama tras cada
+    archivo. Devuelve un informe con los .rpy generados, los saltados, los
+    fallos y los archivos por segundo.
+    """
+    start = time.perf_counter()
+    rpyc_paths = list(dict.fromkeys(os.path.abspath(path) for path in rpyc_paths))
+    base = os.path.commonpath([os.path.dirname(path) for path in rpyc_paths]) if rpyc_paths else None
+    cache = DecompileCache()
+    lock = threading.Lock()
+    done = [0]
+    decompiled = []
+    skipped = []
+    failed = []
+
+    def process(rpyc_path):
+        output_path = output_path_for(rpyc_path, destination, base)
+        try:
+            up_to_date, digest = (False, None) if force else is_up_to_date(rpyc_path, output_path, cache.get(output_path))
+            if up_to_date:
+                result = skipped
+            else:
+                decompile_file(rpyc_path, output_path, command)
+                cache.record(output_path, digest or file_hash(rpyc_path))
+                result = decompiled
+            entry = output_path
+        except (OSError, subprocess.CalledProcessError) as e:
+            result = failed
+            stderr = getattr(e, 'stderr', None)
+            entry = (rpyc_path, stderr.decode('utf-8', 'replace').strip() if stderr else str(e))
+        with lock:
+            result.append(entry)
+            done[0] += 1
+            if progress_callback:
+                progress_callback(done[0], len(rpyc_paths))
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        list(executor.map(process, rpyc_paths))
+    cache.save()
+
+    seconds = time.perf_counter() - start
+    return {
+        'files': len(rpyc_paths),
+        'decompiled': decompiled,
+        'skipped': skipped,
+        'failed': failed,
+        # Todos los .rpy al día, recién generados o no: los que se pueden mandar a traducir
+        'outputs': sorted(decompiled + skipped),
+        'seconds': seconds,
+        'files_per_sec': len(decompiled) / seconds if seconds else 0.0,
+    }
+
+def stale_rpyc_files(folder):
+    """Los .rpyc de una carpeta sin un .rpy al lado que esté al día."""
+    stale = []
+    cache = DecompileCache()
+    for root, dirs, files in os.walk(folder):
+        for file in files:
+            if file.endswith('.rpyc'):
+                rpyc_path = os.path.join(root, file)
+                output_path = output_path_for(rpyc_path)
+                if not is_up_to_date(rpyc_path, output_path, cache.get(output_path))[0]:
+                    stale.append(rpyc_path)
+    return stale
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Decompile .rpyc files in parallel with unrpyc, skipping up-to-date ones")
+    parser.add_argument("paths", nargs="+", help=".rpyc files or folders")
+    parser.add_argument("--output", help="Destination folder (default: next to each .rpyc)")
+    parser.add_argument("--workers", type=int, default=0, help="Parallel unrpyc processes (0 = one per core)")
+    parser.add_argument("--force", action="store_true", help="Decompile even if the .rpy is up to date")
+    parser.add_argument("--unrpyc", default=' '.join(UNRPYC_COMMAND), help="Command used to run unrpyc")
+    args = parser.parse_args()
+
+    rpyc_paths = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            rpyc_paths.extend(os.path.join(root, file) for root, dirs, files in os.walk(path) for file in sorted(files) if file.endswith('.rpyc'))
+        else:
+            rpyc_paths.append(path)
+    report = decompile_files(rpyc_paths, args.output, args.workers or None, args.unrpyc.split(), args.force)
+    print(json.dumps({key: len(value) if isinstance(value, list) else value for key, value in report.items()}))
+    for rpyc_path, error in report['failed']:
+        print(f"Failed: {rpyc_path}: {error}", file=sys.stderr)
+    sys.exit(1 if report['failed'] else 0)
@@ -1,23 +1,173 @@
 #!/usr/bin/python
 # gui.py
 import os
+import time
 import subprocess
 from PyQt6.QtWidgets import *
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt, QObject, QThread, QTimer, pyqtSignal
+from pipeline_stats import PipelineStats, format_summary
+from rpa import RpaError, SCRIPT_PATTERNS, extract_archive
+from decompiler import decompile_files, stale_rpyc_files
+
+class TranslationWorker(QObject):
+    """Ejecuta la traducción fuera del hilo de la interfaz y emite el progreso con señales."""
+    progress = pyqtSignal(dict)
+    finished = pyqtSignal(dict)
+    failed = pyqtSignal(str)
+
+    def __init__(self, translate_files, file_paths, settings, min_interval=0.25):
+        super().__init__()
+        self.translate_files = translate_files
+        self.file_paths = file_paths
+        self.settings = settings
+        self.min_interval = min_interval
+        self.cancelled = False
+        self.start_time = None
+        self.last_emit = 0.0
+
+    def run(self):
+        self.start_time = time.monotonic()
+        try:
+            report = self.translate_files(self.file_paths, self.settings, self.report_progress, self.is_cancelled)
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            report['elapsed'] = time.monotonic() - self.start_time
+            self.finished.emit(report)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def is_cancelled(self):
+        return self.cancelled
+
+    def report_progress(self, info):
+        # Como mucho una actualización cada min_interval segundos, salvo la última
+        now = time.monotonic()
+        done = info['segments_done'] >= info['segments_total']
+        if now - self.last_emit < self.min_interval and not done:
+            return
+        self.last_emit = now
+
+        elapsed = max(now - self.start_time, 1e-6)
+        info['lines_per_sec'] = info['lines_done'] / elapsed
+        info['segments_per_sec'] = info['segments_done'] / elapsed
+        # Con el pipeline segments_total sigue creciendo mientras se leen archivos; percent sale
+        # de los bytes leídos sobre el tamaño total de los archivos, que se conoce desde el principio
+        percent = info['percent']
+        info['eta'] = elapsed * (100 - percent) / percent if percent else None
+        self.progress.emit(info)
+
+class ModelLoader(QObject):
+    """Carga el modelo en segundo plano para que la ventana aparezca sin esperar a transformers/torch."""
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, load_model, quantized):
+        super().__init__()
+        self.load_model = load_model
+        self.quantized = quantized
+
+    def run(self):
+        start_time = time.monotonic()
+        try:
+            tokenizer, model = self.load_model(self.quantized)
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.loaded.emit({
+                'tokenizer': tokenizer,
+                'model': model,
+                'quantized': self.quantized,
+                'seconds': time.monotonic() - start_time,
+            })
+
+class ExtractWorker(QObject):
+    """Extrae un .rpa en segundo plano; con "Everything" puede tardar minutos en archivos de varios GB."""
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(dict)
+    failed = pyqtSignal(str)
+
+    def __init__(self, rpa_file, patterns, backup):
+        super().__init__()
+        self.rpa_file = rpa_file
+        self.patterns = patterns
+        self.backup = backup
+
+    def run(self):
+        try:
+            report = extract_archive(self.rpa_file, patterns=self.patterns, backup=self.backup,
+                                     progress_callback=self.progress.emit)
+        except (RpaError, OSError) as e:
+            self.failed.emit(str(e))
+        else:
+            self.finished.emit(report)
+
+class StaleCheckWorker(QObject):
+    """Busca los .rpyc sin un .rpy al día fuera del hilo de la interfaz (puede calcular el hash de cada uno)."""
+    finished = pyqtSignal(list)
+
+    def __init__(self, folder):
+        super().__init__()
+        self.folder = folder
+
+    def run(self):
+        try:
+            stale = stale_rpyc_files(self.folder)
+        except OSError:
+            stale = []
+        self.finished.emit(stale)
+
+class DecompileWorker(QObject):
+    """Descompila los .rpyc en segundo plano; unrpyc puede tardar varios segundos por archivo."""
+    finished = pyqtSignal(dict)
+    failed = pyqtSignal(str)
+
+    def __init__(self, files, destination_folder=None):
+        super().__init__()
+        self.files = files
+        self.destination_folder = destination_folder
+
+    def run(self):
+        try:
+            report = decompile_files(self.files, self.destination_folder)
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.finished.emit(report)
 
 class TranslatorApp(QMainWindow):
-    def __init__(self, model_name, tokenizer, model, device):
+    def __init__(self, model_name, tokenizer, model, device, memory=None, workers=0, quantized=False, start_time=None):
         super().__init__()
 
         self.model_name = model_name
         self.tokenizer = tokenizer
         self.model = model
         self.device = device
+        self.memory = memory
+        self.workers = workers
+        self.quantized = quantized
         self.current_folder = None
+        self.files_to_translate = []
+        self.last_stats = None
+
+        # Tiempos de arranque: hasta que se ve la ventana y hasta que el modelo está listo
+        self.start_time = start_time or time.monotonic()
+        self.time_to_window = None
+        self.time_to_ready = None
+        self.startup_load_seconds = None
+        self.model_thread = None
+        self.model_loader = None
+        self.decompile_thread = None
+        self.decompile_worker = None
+        self.extract_thread = None
+        self.extract_worker = None
+        self.stale_thread = None
+        self.stale_worker = None
 
         self.is_translating = False
-        self.translation_timer = QTimer(self)
-        self.translation_timer.timeout.connect(self.translate_text)
+        self.translation_thread = None
+        self.translation_worker = None
 
         self.initUI()
 
@@ -30,8 +180,18 @@ class TranslatorApp(QMainWindow):
         main_layout = QVBoxLayout()
         main_widget.setLayout(main_layout)
 
-        self.model_label = QLabel(f"Current Model: {self.model_name}")
-        main_layout.addWidget(self.model_label)
+        model_layout = QHBoxLayout()
+        self.model_label = QLabel()
+        model_layout.addWidget(self.model_label)
+
+        self.quantized_checkbox = QCheckBox("Int8 model (CPU)")
+        self.quantized_checkbox.setChecked(self.quantized)
+        # La cuantización dinámica solo funciona en CPU
+        self.quantized_checkbox.setEnabled(self.device == "cpu")
+        self.quantized_checkbox.toggled.connect(self.toggle_quantized)
+        model_layout.addWidget(self.quantized_checkbox)
+        main_layout.addLayout(model_layout)
+        self.update_model_label()
 
         sliders_layout = QVBoxLayout()
 
@@ -110,12 +270,89 @@ class TranslatorApp(QMainWindow):
         row3_layout.addWidget(self.no_repeat_ngram_size_slider)
         sliders_layout.addLayout(row3_layout)
 
+        # Row 4: batch_size_slider and workers_slider
+        row4_layout = QHBoxLayout()
+        self.batch_size_label = QLabel(f"Batch Size: {16}")
+        self.batch_size_slider = QSlider(Qt.Orientation.Horizontal)
+        self.batch_size_slider.setMinimum(1)
+        self.batch_size_slider.setMaximum(64)
+        self.batch_size_slider.setValue(16)
+        self.batch_size_slider.setTickPosition(QSlider.TickPosition.TicksBelow)
+        self.batch_size_slider.setTickInterval(8)
+        self.batch_size_slider.valueChanged.connect(self.update_slider_labels)
+        row4_layout.addWidget(self.batch_size_label)
+        row4_layout.addWidget(self.batch_size_slider)
+
+        self.workers_label = QLabel(f"CPU Workers: {self.workers}")
+        self.workers_slider = QSlider(Qt.Orientation.Horizontal)
+        self.workers_slider.setMinimum(0)
+        self.workers_slider.setMaximum(os.cpu_count() or 1)
+        self.workers_slider.setValue(self.workers)
+        self.workers_slider.setTickPosition(QSlider.TickPosition.TicksBelow)
+        self.workers_slider.setTickInterval(1)
+        self.workers_slider.valueChanged.connect(self.update_slider_labels)
+        # Los procesos de CPU solo tienen sentido si el modelo no está en la GPU
+        self.workers_slider.setEnabled(self.device == "cpu")
+        row4_layout.addWidget(self.workers_label)
+        row4_layout.addWidget(self.workers_slider)
+        sliders_layout.addLayout(row4_layout)
+
+        # Row 5: max_tokens_slider (miles de tokens por lote; 0 = lotes de tamaño fijo)
+        row5_layout = QHBoxLayout()
+        self.max_tokens_label = QLabel(f"Token Budget: {16000}")
+        self.max_tokens_slider = QSlider(Qt.Orientation.Horizontal)
+        self.max_tokens_slider.setMinimum(0)
+        self.max_tokens_slider.setMaximum(64)
+        self.max_tokens_slider.setValue(16)
+        self.max_tokens_slider.setTickPosition(QSlider.TickPosition.TicksBelow)
+        self.max_tokens_slider.setTickInterval(8)
+        self.max_tokens_slider.valueChanged.connect(self.update_slider_labels)
+        row5_layout.addWidget(self.max_tokens_label)
+        row5_layout.addWidget(self.max_tokens_slider)
+
+        # Las etiquetas se cambian por #1, #2... y la frase se traduce de una vez
+        self.masking_checkbox = QCheckBox("Mask markup ([var], {tag}, <html>)")
+        self.masking_checkbox.setChecked(True)
+        row5_layout.addWidget(self.masking_checkbox)
+
+        # Lectura, traducción y escritura a la vez; cada archivo se escribe en cuanto está listo
+        self.pipeline_checkbox = QCheckBox("Pipeline (write each file as soon as it is done)")
+        self.pipeline_checkbox.setChecked(True)
+        row5_layout.addWidget(self.pipeline_checkbox)
+
+        # Un modelo por par de idiomas según el idioma detectado en cada archivo (no con el pool ni el servidor)
+        self.auto_model_checkbox = QCheckBox("Auto-detect source language")
+        self.auto_model_checkbox.setChecked(False)
+        row5_layout.addWidget(self.auto_model_checkbox)
+
+        # Haces y max_length según el tamaño de cada fragmento; los sliders pasan a ser el máximo
+        self.adaptive_checkbox = QCheckBox("Adaptive decoding")
+        self.adaptive_checkbox.setChecked(False)
+        row5_layout.addWidget(self.adaptive_checkbox)
+        sliders_layout.addLayout(row5_layout)
+
         main_layout.addLayout(sliders_layout)
 
 
         self.progress_bar = QProgressBar()
         main_layout.addWidget(self.progress_bar)
 
+        self.throughput_label = QLabel()
+        main_layout.addWidget(self.throughput_label)
+
+        self.memory_label = QLabel()
+        main_layout.addWidget(self.memory_label)
+        self.update_memory_label()
+
+        self.dedup_label = QLabel()
+        main_layout.addWidget(self.dedup_label)
+
+        self.index_label = QLabel()
+        main_layout.addWidget(self.index_label)
+
+        self.stats_label = QLabel()
+        main_layout.addWidget(self.stats_label)
+
         btn_layout = QHBoxLayout()
         main_layout.addLayout(btn_layout)
 
@@ -164,6 +401,24 @@ class TranslatorApp(QMainWindow):
         self.unpyc_btn.clicked.connect(self.unpyc_files)
         new_btn_layout.addWidget(self.unpyc_btn)
 
+        memory_btn_layout = QHBoxLayout()
+        main_layout.addLayout(memory_btn_layout)
+
+        self.export_memory_btn = QPushButton("Exportar memoria")
+        self.export_memory_btn.clicked.connect(self.export_memory)
+        self.export_memory_btn.setEnabled(self.memory is not None)
+        memory_btn_layout.addWidget(self.export_memory_btn)
+
+        self.import_memory_btn = QPushButton("Importar memoria")
+        self.import_memory_btn.clicked.connect(self.import_memory)
+        self.import_memory_btn.setEnabled(self.memory is not None)
+        memory_btn_layout.addWidget(self.import_memory_btn)
+
+        self.export_stats_btn = QPushButton("Exportar estadísticas")
+        self.export_stats_btn.clicked.connect(self.export_stats)
+        self.export_stats_btn.setEnabled(False)
+        memory_btn_layout.addWidget(self.export_stats_btn)
+
         bottom_frame = QFrame()
         bottom_frame.setFrameShape(QFrame.Shape.StyledPanel)
         bottom_layout = QVBoxLayout()
@@ -176,6 +431,19 @@ class TranslatorApp(QMainWindow):
         main_layout.addWidget(bottom_frame)
 
         self.show()
+        # Se dispara en cuanto el bucle de eventos pinta la ventana
+        QTimer.singleShot(0, self.window_shown)
+
+    def window_shown(self):
+        self.time_to_window = time.monotonic() - self.start_time
+        self.update_model_label()
+
+    @property
+    def model_ready(self):
+        return self.model is not None and self.model_thread is None
+
+    def update_start_button(self):
+        self.start_btn.setEnabled(self.model_ready and not self.is_translating and bool(self.files_to_translate))
 
     def update_slider_labels(self):
         self.max_length_label.setText(f"Maximum Output Length: {self.max_length_slider.value()}")
@@ -184,37 +452,233 @@ class TranslatorApp(QMainWindow):
         self.repetition_penalty_label.setText(f"Repetition Penalty: {self.repetition_penalty_slider.value() / 10.0}")
         self.length_penalty_label.setText(f"Length Penalty: {self.length_penalty_slider.value() / 10.0}")
         self.no_repeat_ngram_size_label.setText(f"No Repeat N-gram Size: {self.no_repeat_ngram_size_slider.value()}")
+        self.batch_size_label.setText(f"Batch Size: {self.batch_size_slider.value()}")
+        self.workers_label.setText(f"CPU Workers: {self.workers_slider.value()}")
+        max_tokens = self.max_tokens_slider.value() * 1000
+        self.max_tokens_label.setText(f"Token Budget: {max_tokens if max_tokens else 'off'}")
+
+    def update_model_label(self):
+        variant = " (int8)" if self.quantized else ""
+        if self.model_thread is not None:
+            self.model_label.setText(f"Loading model: {self.model_name}{variant}...")
+        elif self.model is None:
+            self.model_label.setText(f"Model not loaded: {self.model_name}{variant}")
+        elif self.time_to_ready is not None:
+            window = f"window {self.time_to_window:.1f}s, " if self.time_to_window is not None else ""
+            self.model_label.setText(f"Current Model: {self.model_name}{variant} "
+                                     f"(ready in {self.time_to_ready:.1f}s: {window}load {self.startup_load_seconds:.1f}s)")
+        else:
+            self.model_label.setText(f"Current Model: {self.model_name}{variant}")
+
+    def load_model(self, quantized):
+        return self.parent().load_model(quantized)
+
+    def start_model_loading(self, quantized):
+        """Carga (o cambia) el modelo en otro hilo; mientras tanto no se puede traducir."""
+        self.model_thread = QThread(self)
+        self.model_loader = ModelLoader(self.load_model, quantized)
+        self.model_loader.moveToThread(self.model_thread)
+        self.model_thread.started.connect(self.model_loader.run)
+        self.model_loader.loaded.connect(self.model_loaded)
+        self.model_loader.failed.connect(self.model_failed)
+        self.model_loader.loaded.connect(self.model_thread.quit)
+        self.model_loader.failed.connect(self.model_thread.quit)
+        self.model_thread.finished.connect(self.model_thread_finished)
+        self.quantized_checkbox.setEnabled(False)
+        self.update_model_label()
+        self.update_start_button()
+        self.model_thread.start()
+
+    def model_loaded(self, result):
+        self.tokenizer = result['tokenizer']
+        self.model = result['model']
+        self.quantized = result['quantized']
+        if self.time_to_ready is None:
+            self.time_to_ready = time.monotonic() - self.start_time
+            self.startup_load_seconds = result['seconds']
+
+    def model_failed(self, error):
+        QMessageBox.critical(self, "Model Error", f"Failed to load the model.\nError: {error}")
+
+    def model_thread_finished(self):
+        self.model_thread = None
+        self.model_loader = None
+        self.quantized_checkbox.blockSignals(True)
+        self.quantized_checkbox.setChecked(self.quantized)
+        self.quantized_checkbox.blockSignals(False)
+        # La cuantización dinámica solo funciona en CPU
+        self.quantized_checkbox.setEnabled(self.device == "cpu")
+        self.update_model_label()
+        self.update_start_button()
+
+    def toggle_quantized(self, checked):
+        if self.is_translating or self.model_thread is not None:
+            self.quantized_checkbox.blockSignals(True)
+            self.quantized_checkbox.setChecked(self.quantized)
+            self.quantized_checkbox.blockSignals(False)
+            return
+        self.start_model_loading(checked)
 
     def load_files(self):
         files, _ = QFileDialog.getOpenFileNames(self, "Select files to translate", "", "RPY Files (*.rpy)")
         self.file_list_widget.clear()
         self.files_to_translate = files
         self.file_list_widget.addItems(files)
-        self.start_btn.setEnabled(True)
+        self.update_start_button()
+
+    def translation_settings(self):
+        return {
+            'max_length': self.max_length_slider.value(),
+            'num_beams': self.num_beams_slider.value(),
+            'temperature': self.temperature_slider.value() / 10.0,
+            'repetition_penalty': self.repetition_penalty_slider.value() / 10.0,
+            'length_penalty': self.length_penalty_slider.value() / 10.0,
+            'no_repeat_ngram_size': self.no_repeat_ngram_size_slider.value(),
+            'batch_size': self.batch_size_slider.value(),
+            'workers': self.workers_slider.value(),
+            'max_tokens': self.max_tokens_slider.value() * 1000,
+            'masking': self.masking_checkbox.isChecked(),
+            'pipelined': self.pipeline_checkbox.isChecked(),
+            'auto_model': self.auto_model_checkbox.isChecked(),
+            'adaptive': self.adaptive_checkbox.isChecked(),
+        }
 
     def start_translation(self):
+        if not self.model_ready:
+            return
         self.is_translating = True
-        self.translation_timer.start(100)
         self.start_btn.setEnabled(False)
         self.stop_btn.setEnabled(True)
+        self.translate_text()
 
     def stop_translation(self):
-        self.is_translating = False
-        self.translation_timer.stop()
-        self.start_btn.setEnabled(True)
-        self.stop_btn.setEnabled(False)
-        QMessageBox.information(self, "Translation Stopped", "Translation process has been stopped.")
+        if self.translation_worker is not None:
+            # La cancelación se aplica al terminar el lote en curso
+            self.translation_worker.cancel()
+            self.stop_btn.setEnabled(False)
+            self.throughput_label.setText("Stopping after the current batch...")
 
     def translate_text_in_file(self, file_path):
         self.parent().translate_text_in_file(file_path)
 
+    def translate_files(self, file_paths, settings, progress_callback, should_stop):
+        return self.parent().translate_files(file_paths, settings, progress_callback, should_stop)
+
     def translate_text(self):
-        if not self.files_to_translate:
-            self.stop_translation()
+        # Se traducen todos los .rpy de una vez para deduplicar los fragmentos repetidos
+        file_paths = [file for file in self.files_to_translate if file.endswith('.rpy')]
+        self.files_to_translate = []
+        self.progress_bar.setValue(0)
+
+        self.translation_thread = QThread(self)
+        self.translation_worker = TranslationWorker(self.translate_files, file_paths, self.translation_settings())
+        self.translation_worker.moveToThread(self.translation_thread)
+        self.translation_thread.started.connect(self.translation_worker.run)
+        self.translation_worker.progress.connect(self.update_progress)
+        self.translation_worker.finished.connect(self.translation_finished)
+        self.translation_worker.failed.connect(self.translation_failed)
+        self.translation_worker.finished.connect(self.translation_thread.quit)
+        self.translation_worker.failed.connect(self.translation_thread.quit)
+        self.translation_thread.finished.connect(self.translation_thread_finished)
+        self.translation_thread.start()
+
+    def update_progress(self, info):
+        self.progress_bar.setValue(info['percent'])
+        eta = f"{int(info['eta'] // 60)}m {int(info['eta'] % 60)}s" if info['eta'] is not None else "--"
+        self.throughput_label.setText(
+            f"Lines: {info['lines_done']}/{info['lines_total']} ({info['lines_per_sec']:.1f}/s) | "
+            f"Segments: {info['segments_done']}/{info['segments_total']} ({info['segments_per_sec']:.1f}/s) | ETA: {eta}"
+        )
+
+    def translation_finished(self, report):
+        self.update_memory_label()
+        self.update_dedup_label(report)
+        language_id_seconds = report['language_id_seconds']
+        slowest = max(language_id_seconds, key=language_id_seconds.get, default=None)
+        self.index_label.setText(
+            f"Project index: {report['reused_lines']} lines reused, {report['translated_lines']} freshly translated | "
+            f"Language ID: {sum(language_id_seconds.values()):.2f}s"
+            + (f" (slowest: {os.path.basename(slowest)} {language_id_seconds[slowest]:.2f}s)" if slowest else "")
+        )
+        self.throughput_label.setText(
+            f"{report['lines_done']}/{report['lines_total']} lines in {report['elapsed']:.1f}s "
+            f"({report['lines_done'] / max(report['elapsed'], 1e-6):.1f} lines/s)"
+        )
+        self.last_stats = report['stats']
+        summary = format_summary(self.last_stats)
+        if 'registry' in report:
+            registry = report['registry']
+            summary += (
+                f"\nModels: {', '.join(sorted(set(report['models'].values()))) or '-'} | "
+                f"{registry['loads']} loaded ({registry['load_seconds']:.1f}s), {registry['hits']} reused, "
+                f"{registry['evictions']} evicted, {registry['resident_mb']:.0f}/{registry['budget_mb'] or '-'} MB resident"
+            )
+        self.stats_label.setText(summary)
+        self.export_stats_btn.setEnabled(True)
+        for fallback in report.get('fallbacks', ()):
+            QMessageBox.warning(
+                self, "Model Not Available",
+                f"{fallback['model']} could not be loaded, so {len(fallback['files'])} files were translated with "
+                f"{fallback['used']} instead:\n" + '\n'.join(os.path.basename(path) for path in fallback['files'][:10])
+                + f"\nError: {fallback['error']}"
+            )
+        if report['cancelled']:
+            QMessageBox.information(self, "Translation Stopped", "Translation process has been stopped.")
+        else:
+            self.progress_bar.setValue(100)
+            QMessageBox.information(self, "Translation Complete", f"{report['files']} files translated.")
+
+    def translation_failed(self, error):
+        self.update_memory_label()
+        QMessageBox.critical(self, "Translation Error", f"Translation failed.\nError: {error}")
+
+    def translation_thread_finished(self):
+        self.is_translating = False
+        self.translation_worker = None
+        self.translation_thread = None
+        self.stop_btn.setEnabled(False)
+        self.update_start_button()
+
+    def update_dedup_label(self, report):
+        self.dedup_label.setText(
+            f"Dedup: {report['occurrences']} segments in {report['files']} files -> {report['unique']} unique "
+            f"({report['saved']} model inputs saved, {report['saved_percent']:.1f}%)"
+        )
+
+    def update_memory_label(self):
+        if self.memory is None:
+            self.memory_label.setText("Translation memory: disabled")
             return
+        stats = self.memory.stats()
+        self.memory_label.setText(f"Translation memory: {stats['entries']} entries, {stats['hits']} hits, {stats['misses']} misses")
+
+    def export_memory(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export translation memory", "", "JSON Lines (*.jsonl)")
+        if file_path:
+            try:
+                count = self.memory.export_to(file_path)
+                QMessageBox.information(self, "Export Complete", f"{count} entries exported to {file_path}.")
+            except Exception as e:
+                QMessageBox.critical(self, "Export Error", f"Failed to export translation memory.\nError: {str(e)}")
+
+    def import_memory(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Import translation memory", "", "JSON Lines (*.jsonl)")
+        if file_path:
+            try:
+                count = self.memory.import_from(file_path)
+                self.update_memory_label()
+                QMessageBox.information(self, "Import Complete", f"{count} entries imported from {file_path}.")
+            except Exception as e:
+                QMessageBox.critical(self, "Import Error", f"Failed to import translation memory.\nError: {str(e)}")
 
-        file_path = self.files_to_translate.pop(0)
-        self.translate_text_in_file(file_path)
+    def export_stats(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export pipeline stats", "", "JSON (*.json);;Prometheus (*.prom)")
+        if file_path:
+            try:
+                PipelineStats.from_snapshot(self.last_stats).dump(file_path)
+                QMessageBox.information(self, "Export Complete", f"Pipeline stats exported to {file_path}.")
+            except Exception as e:
+                QMessageBox.critical(self, "Export Error", f"Failed to export pipeline stats.\nError: {str(e)}")
 
     def select_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Select a folder")
@@ -232,10 +696,31 @@ class TranslatorApp(QMainWindow):
                         files.append(os.path.join(root, file))
             self.files_to_translate = files
             self.file_list_widget.addItems(files)
-            self.start_btn.setEnabled(True)
+            self.update_start_button()
+            # Los .rpyc sin un .rpy al día se pueden descompilar ya y pasan a la lista
+            if self.stale_thread is None:
+                self.stale_thread = QThread(self)
+                self.stale_worker = StaleCheckWorker(self.current_folder)
+                self.stale_worker.moveToThread(self.stale_thread)
+                self.stale_thread.started.connect(self.stale_worker.run)
+                self.stale_worker.finished.connect(self.stale_checked)
+                self.stale_worker.finished.connect(self.stale_thread.quit)
+                self.stale_thread.finished.connect(self.stale_thread_finished)
+                self.stale_thread.start()
         else:
             QMessageBox.warning(self, "No Folder Selected", "Please select a folder first.")
 
+    def stale_checked(self, stale):
+        if stale and QMessageBox.question(
+            self, "Decompile scripts",
+            f"{len(stale)} .rpyc files have no up-to-date .rpy. Decompile them now and queue them for translation?"
+        ) == QMessageBox.StandardButton.Yes:
+            self.decompile(stale)
+
+    def stale_thread_finished(self):
+        self.stale_thread = None
+        self.stale_worker = None
+
     def unzip_file(self):
         zip_file, _ = QFileDialog.getOpenFileName(self, "Select a .zip file to extract", "", "ZIP Files (*.zip)")
         if zip_file:
@@ -262,35 +747,123 @@ class TranslatorApp(QMainWindow):
     def unrpa_files(self):
         rpa_file, _ = QFileDialog.getOpenFileName(self, "Select an .rpa file to extract", "", "RPA Files (*.rpa)")
         if rpa_file:
-            destination_folder = os.path.dirname(rpa_file)
-            try:
-                # Ejecutar el comando unrpa
-                subprocess.run(['unrpa', '-mp', destination_folder, rpa_file], check=True)
-                # Renombrar el archivo .rpa a .rpb
-                new_file_name = rpa_file.replace('.rpa', '.rpa-backup')
-                os.rename(rpa_file, new_file_name)
-                QMessageBox.information(self, "Extraction Complete", f"RPA file extracted successfully to {destination_folder}.\nOriginal RPA file renamed to {new_file_name}.")
-            except subprocess.CalledProcessError as e:
-                QMessageBox.critical(self, "Extraction Error", f"Failed to extract RPA file.\nError: {str(e)}")
-            except Exception as e:
-                QMessageBox.critical(self, "Renaming Error", f"Failed to rename RPA file.\nError: {str(e)}")
+            # Normalmente solo hacen falta los scripts; las imágenes y el audio ocupan casi todo el archivo
+            dialog = QMessageBox(self)
+            dialog.setWindowTitle("UnRpa")
+            dialog.setText(f"Extract {os.path.basename(rpa_file)} next to the archive.")
+            scripts_btn = dialog.addButton("Scripts only (.rpy/.rpyc)", QMessageBox.ButtonRole.AcceptRole)
+            all_btn = dialog.addButton("Everything", QMessageBox.ButtonRole.AcceptRole)
+            dialog.addButton(QMessageBox.StandardButton.Cancel)
+            backup_checkbox = QCheckBox("Rename the archive to .rpa-backup afterwards")
+            dialog.setCheckBox(backup_checkbox)
+            dialog.exec()
+            if dialog.clickedButton() not in (scripts_btn, all_btn):
+                return
+            patterns = SCRIPT_PATTERNS if dialog.clickedButton() is scripts_btn else None
+            self.extract(rpa_file, patterns, backup_checkbox.isChecked())
+
+    def extract(self, rpa_file, patterns, backup):
+        """Extrae el .rpa en otro hilo, con el avance en la barra de estado."""
+        if self.extract_thread is not None:
+            QMessageBox.warning(self, "Extraction Running", "Wait for the current extraction to finish.")
+            return
+        self.extract_thread = QThread(self)
+        self.extract_worker = ExtractWorker(rpa_file, patterns, backup)
+        self.extract_worker.moveToThread(self.extract_thread)
+        self.extract_thread.started.connect(self.extract_worker.run)
+        self.extract_worker.progress.connect(self.extract_progress)
+        self.extract_worker.finished.connect(self.extract_finished)
+        self.extract_worker.failed.connect(self.extract_failed)
+        self.extract_worker.finished.connect(self.extract_thread.quit)
+        self.extract_worker.failed.connect(self.extract_thread.quit)
+        self.extract_thread.finished.connect(self.extract_thread_finished)
+        self.statusBar().showMessage(f"Extracting {os.path.basename(rpa_file)}...")
+        self.extract_thread.start()
+
+    def extract_progress(self, done, total):
+        self.statusBar().showMessage(f"Extracting: {done}/{total} files")
+
+    def extract_thread_finished(self):
+        self.extract_thread = None
+        self.extract_worker = None
+
+    def extract_failed(self, error):
+        self.statusBar().showMessage("Extraction failed.")
+        QMessageBox.critical(self, "Extraction Error", f"Failed to extract RPA file.\nError: {error}")
+
+    def extract_finished(self, report):
+        message = (
+            f"{report['files']} files ({report['bytes'] / 1024 / 1024:.1f} MB) extracted to {report['destination']} "
+            f"in {report['seconds']:.1f}s ({report['mb_per_sec']:.1f} MB/s).\n"
+            f"{report['skipped_files']} files skipped ({report['skipped_bytes'] / 1024 / 1024:.1f} MB)."
+        )
+        if report['backup']:
+            message += f"\nOriginal RPA file renamed to {report['backup']}."
+        self.statusBar().showMessage(message.replace('\n', ' '))
+        QMessageBox.information(self, "Extraction Complete", message)
+        if self.current_folder:
+            self.detect_files()
 
     def unpyc_files(self):
         files, _ = QFileDialog.getOpenFileNames(self, "Select .rpyc files to decompile", "", "RPYC Files (*.rpyc)")
         if files:
             destination_folder = QFileDialog.getExistingDirectory(self, "Select destination folder for decompiled files", "")
             if destination_folder:
-                try:
-                    for file in files:
-                        output_file = os.path.join(destination_folder, os.path.basename(file).replace('.rpyc', '.rpy'))
-                        subprocess.run(['unrpyc', file], check=True)
-                    QMessageBox.information(self, "Decompilation Complete", "Selected .rpyc files have been decompiled successfully.")
-                except subprocess.CalledProcessError as e:
-                    QMessageBox.critical(self, "Decompilation Error", f"Failed to decompile .rpyc files.\nError: {str(e)}")
-                except Exception as e:
-                    QMessageBox.critical(self, "Decompilation Error", f"An error occurred during the decompilation process.\nError: {str(e)}")
+                self.decompile(files, destination_folder)
+
+    def decompile(self, files, destination_folder=None):
+        """Descompila los .rpyc en otro hilo y añade los .rpy resultantes a la lista de archivos a traducir."""
+        if self.decompile_thread is not None:
+            QMessageBox.warning(self, "Decompilation Running", "Wait for the current decompilation to finish.")
+            return
+        self.decompile_thread = QThread(self)
+        self.decompile_worker = DecompileWorker(files, destination_folder)
+        self.decompile_worker.moveToThread(self.decompile_thread)
+        self.decompile_thread.started.connect(self.decompile_worker.run)
+        self.decompile_worker.finished.connect(self.decompile_finished)
+        self.decompile_worker.failed.connect(self.decompile_failed)
+        self.decompile_worker.finished.connect(self.decompile_thread.quit)
+        self.decompile_worker.failed.connect(self.decompile_thread.quit)
+        self.decompile_thread.finished.connect(self.decompile_thread_finished)
+        self.statusBar().showMessage(f"Decompiling {len(files)} .rpyc files...")
+        self.decompile_thread.start()
+
+    def decompile_thread_finished(self):
+        self.decompile_thread = None
+        self.decompile_worker = None
+
+    def decompile_failed(self, error):
+        self.statusBar().showMessage("Decompilation failed.")
+        QMessageBox.critical(self, "Decompilation Error", f"An error occurred during the decompilation process.\nError: {error}")
+
+    def decompile_finished(self, report):
+        self.queue_files(report['outputs'])
+        message = (
+            f"{len(report['decompiled'])} files decompiled in {report['seconds']:.1f}s ({report['files_per_sec']:.1f} files/s), "
+            f"{len(report['skipped'])} already up to date. {len(report['outputs'])} scripts queued for translation."
+        )
+        self.statusBar().showMessage(message)
+        if report['failed']:
+            failures = '\n'.join(f"{os.path.basename(path)}: {error}" for path, error in report['failed'][:10])
+            QMessageBox.warning(self, "Decompilation Error", f"{message}\n{len(report['failed'])} files failed:\n{failures}")
+        else:
+            QMessageBox.information(self, "Decompilation Complete", message)
+
+    def queue_files(self, file_paths):
+        new_files = [file_path for file_path in file_paths if file_path not in self.files_to_translate]
+        self.files_to_translate.extend(new_files)
+        self.file_list_widget.addItems(new_files)
+        self.update_start_button()
 
     def closeEvent(self, event):
         if self.is_translating:
             self.stop_translation()
+            self.translation_thread.quit()
+            self.translation_thread.wait()
+        for thread in (self.decompile_thread, self.extract_thread, self.stale_thread):
+            if thread is not None:
+                thread.wait()
+        if self.model_thread is not None:
+            # from_pretrained no se puede interrumpir: hay que esperar a que termine
+            self.model_thread.wait()
         event.accept()
@@ -0,0 +1,171 @@
+#!/usr/bin/python
+# inference_backends.py
+# Motores de inferencia intercambiables: PyTorch (el de siempre) y ONNX Runtime. Los dos devuelven
+# (tokenizador, modelo) con el mismo generate(), así que el resto del programa no cambia.
+import os
+import sys
+import time
+import shutil
+import argparse
+
+# Los modelos exportados se guardan aquí, uno por carpeta, igual que las copias int8 del instalador
+ONNX_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "traductor", "onnx")
+DEFAULT_BACKEND = "torch"
+
+def onnx_model_dir(model_name, quantized=False):
+    return os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "--"), "int8" if quantized else "fp32")
+
+def is_exported(folder):
+    return os.path.isdir(folder) and any(file.endswith('.onnx') for file in os.listdir(folder))
+
+def onnx_files_bytes(folder):
+    """Tamaño de los pesos exportados (.onnx y sus .onnx_data), lo que ocupa el modelo al cargarlo."""
+    return sum(
+        os.path.getsize(os.path.join(folder, file))
+        for file in os.listdir(folder) if file.endswith(('.onnx', '.onnx_data'))
+    )
+
+def export_onnx(model_name, quantized=False):
+    """Exporta el codificador y el decodificador (con caché de claves/valores) una sola vez.
+
+    La copia int8 se obtiene cuantizando los pesos de la exportación normal.
+    Devuelve la carpeta con los .onnx, la configuración y el tokenizador.
+    """
+    folder = onnx_model_dir(model_name, quantized)
+    if is_exported(folder):
+        return folder
+    if quantized:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        source = export_onnx(model_name)
+        temp_folder = folder + '.tmp'
+        shutil.rmtree(temp_folder, ignore_errors=True)
+        os.makedirs(temp_folder)
+        for file in os.listdir(source):
+            if file.endswith('.onnx'):
+                quantize_dynamic(os.path.join(source, file), os.path.join(temp_folder, file), weight_type=QuantType.QInt8)
+            elif not file.endswith('.onnx_data'):
+                shutil.copy(os.path.join(source, file), temp_folder)
+    else:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        from transformers import AutoTokenizer
+        temp_folder = folder + '.tmp'
+        shutil.rmtree(temp_folder, ignore_errors=True)
+        ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True, use_cache=True).save_pretrained(temp_folder)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(temp_folder)
+    # Se renombra al final para que una exportación cortada no parezca terminada
+    shutil.rmtree(folder, ignore_errors=True)
+    os.replace(temp_folder, folder)
+    return folder
+
+class TorchBackend:
+    """transformers + PyTorch, como hasta ahora."""
+    name = "torch"
+
+    def load(self, model_name, device="cpu", quantized=False, tokenizer=None, threads=None):
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        if quantized:
+            from model_installer import load_model
+            return load_model(model_name, quantized=True, tokenizer=tokenizer)
+        from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+        tokenizer = tokenizer or AutoTokenizer.from_pretrained(model_name)
+        return tokenizer, AutoModelForSeq2SeqLM.from_pretrained(model_name).to(device)
+
+class OnnxBackend:
+    """ONNX Runtime a través de optimum.
+
+    El modelo tiene el mismo generate() que el de transformers (búsqueda voraz
+    o por haces, con los mismos parámetros de los sliders) y reutiliza la caché
+    de claves/valores del decodificador entre pasos.
+    """
+    name = "onnx"
+
+    def load(self, model_name, device="cpu", quantized=False, tokenizer=None, threads=None):
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        from transformers import AutoTokenizer
+        folder = export_onnx(model_name, quantized)
+        provider = "CUDAExecutionProvider" if device == "cuda" and not quantized else "CPUExecutionProvider"
+        session_options = onnxruntime.SessionOptions()
+        if threads:
+            # En cpu_pool cada proceso usa solo su parte de los núcleos
+            session_options.intra_op_num_threads = threads
+            session_options.inter_op_num_threads = 1
+        model = ORTModelForSeq2SeqLM.from_pretrained(folder, use_cache=True, provider=provider, session_options=session_options)
+        # Para la memoria de traducción y el registro el modelo se sigue llamando como el original
+        model.name_or_path = model_name
+        model.onnx_folder = folder
+        return tokenizer or AutoTokenizer.from_pretrained(folder), model
+
+BACKENDS = {backend.name: backend for backend in (TorchBackend, OnnxBackend)}
+
+def get_backend(name=DEFAULT_BACKEND):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r} (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
+
+def compare_backends(model_name, texts, device="cpu", batch_size=16, generation_kwargs=None, backends=("torch", "onnx")):
+    """Prueba de paridad: traduce los mismos textos con cada motor y compara velocidad y resultado.
+
+    El primer motor hace de referencia; 100 de BLEU/chrF y 0 diferencias
+    significa que el otro da exactamente lo mismo.
+    """
+    from main import generate_batch
+    from metrics import corpus_bleu, corpus_chrf
+    generation_kwargs = generation_kwargs or {}
+    results = {}
+    for name in backends:
+        start = time.perf_counter()
+        tokenizer, model = get_backend(name).load(model_name, device)
+        load_seconds = time.perf_counter() - start
+        outputs = []
+        start = time.perf_counter()
+        for i in range(0, len(texts), batch_size):
+            outputs.extend(generate_batch(texts[i:i + batch_size], tokenizer, model, device, generation_kwargs))
+        seconds = time.perf_counter() - start
+        results[name] = {
+            'load_seconds': load_seconds,
+            'seconds': seconds,
+            'segments_per_sec': len(texts) / seconds if seconds else 0.0,
+            'outputs': outputs,
+        }
+
+    reference = results[backends[0]]['outputs']
+    for name in backends[1:]:
+        outputs = results[name]['outputs']
+        results[name]['different_segments'] = sum(1 for a, b in zip(outputs, reference) if a != b)
+        results[name]['bleu_vs_reference'] = corpus_bleu(outputs, reference)
+        results[name]['chrf_vs_reference'] = corpus_chrf(outputs, reference)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export a model to ONNX and check it against the PyTorch backend")
+    parser.add_argument("--model", default="Helsinki-NLP/opus-mt-en-es")
+    parser.add_argument("--quantized", action="store_true", help="Export the int8 copy too")
+    parser.add_argument("--parity", nargs="+", metavar="RPY", help="Compare torch vs onnx on lines taken from these .rpy files")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--num-beams", type=int, default=4)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--max-different", type=float, default=0.02,
+                        help="Largest share of segments allowed to differ before --parity fails")
+    args = parser.parse_args()
+
+    if not args.parity:
+        print(f"Exported to {export_onnx(args.model, args.quantized)}")
+        sys.exit(0)
+
+    from main import make_generation_kwargs
+    from model_installer import sample_rpy_texts
+    texts = sample_rpy_texts(args.parity, args.samples)
+    if not texts:
+        print("No translatable lines found.")
+        sys.exit(1)
+    generation_kwargs = make_generation_kwargs(args.max_length, args.num_beams, 1.0, 1.2, 1.0, 0)
+    results = compare_backends(args.model, texts, generation_kwargs=generation_kwargs)
+    for name, result in results.items():
+        print(f"{name}: load {result['load_seconds']:.1f}s, {result['seconds']:.2f}s ({result['segments_per_sec']:.1f} segments/s)")
+    onnx = results['onnx']
+    print(f"onnx vs torch: {onnx['different_segments']}/{len(texts)} segments differ, "
+          f"BLEU {onnx['bleu_vs_reference']:.1f}, chrF {onnx['chrf_vs_reference']:.1f}")
+    sys.exit(0 if onnx['different_segments'] <= args.max_different * len(texts) else 1)
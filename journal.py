@@ -0,0 +1,78 @@
+#!/usr/bin/python
+# journal.py
+import os
+import json
+
+JOURNAL_SUFFIX = '.journal'
+TEMP_SUFFIX = '.tmp'
+
+def journal_path_for(file_path, output_path=None):
+    """El diario va junto al archivo que se va a escribir: con output_path el árbol de origen no se toca."""
+    return (output_path or file_path) + JOURNAL_SUFFIX
+
+def source_signature(file_path):
+    """Identifica la versión del archivo original para no reanudar sobre un archivo distinto."""
+    stat = os.stat(file_path)
+    return {'source': os.path.basename(file_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def open_journal(file_path, signature, output_path=None):
+    """Abre el diario de un archivo para seguir escribiendo en él.
+
+    Devuelve el diario abierto y el número de líneas del original que ya están
+    traducidas. Si el diario es de otra versión del archivo se empieza de cero;
+    si la última entrada quedó a medias (cierre inesperado) se descarta.
+    """
+    journal_path = journal_path_for(file_path, output_path)
+    lines_done = 0
+    valid_size = 0
+    if os.path.exists(journal_path):
+        with open(journal_path, 'rb') as journal:
+            header = None
+            while True:
+                record_line = journal.readline()
+                if not record_line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(record_line)
+                except ValueError:
+                    break
+                if header is None:
+                    if record != signature:
+                        break
+                    header = record
+                else:
+                    lines_done += record['lines_in']
+                valid_size = journal.tell()
+
+    if valid_size == 0:
+        lines_done = 0
+        os.makedirs(os.path.dirname(os.path.abspath(journal_path)), exist_ok=True)
+        journal = open(journal_path, 'wb')
+        journal.write((json.dumps(signature) + '\n').encode('utf-8'))
+        journal.flush()
+    else:
+        os.truncate(journal_path, valid_size)
+        journal = open(journal_path, 'ab')
+    return journal, lines_done
+
+def write_record(journal, lines_in, output_lines):
+    """Apunta en el diario un bloque terminado: cuántas líneas originales cubre y su traducción."""
+    record = json.dumps({'lines_in': lines_in, 'output': output_lines}, ensure_ascii=False)
+    journal.write((record + '\n').encode('utf-8'))
+    journal.flush()
+    os.fsync(journal.fileno())
+
+def finalize_journal(file_path, output_path=None):
+    """Vuelca el diario a un archivo temporal y lo renombra sobre el original (u output_path) de forma atómica."""
+    journal_path = journal_path_for(file_path, output_path)
+    output_path = output_path or file_path
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    temp_path = output_path + TEMP_SUFFIX
+    with open(journal_path, 'rb') as journal, open(temp_path, 'w', encoding='utf-8') as output:
+        journal.readline()
+        for record_line in journal:
+            output.writelines(json.loads(record_line)['output'])
+        output.flush()
+        os.fsync(output.fileno())
+    os.replace(temp_path, output_path)
+    os.remove(journal_path)
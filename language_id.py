@@ -0,0 +1,114 @@
+#!/usr/bin/python
+# language_id.py
+import re
+import time
+import threading
+
+# Pistas para frases cortas, donde los detectores estadísticos fallan mucho
+SHORT_TEXT_MARKERS = {
+    'es': (
+        set('ñÑ¿¡áéíóúÁÉÍÓÚü'),
+        {"sí", "si", "no", "hola", "vale", "gracias", "bueno", "claro", "qué", "que", "por", "favor",
+         "adiós", "adios", "vamos", "oye", "mira", "perdón", "perdon", "genial", "ya", "y", "tú", "tu",
+         "yo", "él", "ella", "nada", "nunca", "siempre", "bien", "mal", "ahora", "aquí", "allí", "eh"},
+    ),
+}
+
+WORD_PATTERN = re.compile(r"[^\W\d_]+")
+
+class LangdetectDetector:
+    """Detector basado en langdetect con semilla fija, para que dé siempre el mismo resultado."""
+
+    def __init__(self, seed=0):
+        # langdetect se importa en la primera detección, no al arrancar
+        self.seed = seed
+
+    def __call__(self, texts):
+        from langdetect import DetectorFactory, detect, LangDetectException
+        DetectorFactory.seed = self.seed
+        languages = []
+        for text in texts:
+            try:
+                languages.append(detect(text))
+            except LangDetectException:
+                languages.append(None)
+        return languages
+
+class LanguageIdentifier:
+    """Decide por lotes qué textos ya están en el idioma de destino.
+
+    El detector es intercambiable (cualquier función lista de textos -> lista de
+    códigos de idioma) y solo se usa para textos largos y no vistos antes: los
+    resultados se guardan por texto y las frases cortas se resuelven con pistas
+    sencillas. Lleva la cuenta del tiempo gastado para ver cuánto pesa por archivo.
+    """
+
+    def __init__(self, target_language="es", detector=None, short_words=3, max_cache_entries=200000):
+        self.target_language = target_language
+        self.detector = detector or LangdetectDetector()
+        self.short_words = short_words
+        self.max_cache_entries = max_cache_entries
+        self.cache = {}
+        self.seconds = 0.0
+        self.texts = 0
+        self.cache_hits = 0
+        self.detected = 0
+        # Los hilos lectores del pipeline comparten el mismo identificador
+        self.lock = threading.Lock()
+
+    def classify_short(self, text, words):
+        """Resuelve las frases cortas sin llamar al detector."""
+        if not words:
+            # Sin letras ("...", "!?", números) no hay nada que traducir
+            return True
+        markers = SHORT_TEXT_MARKERS.get(self.target_language)
+        if markers is None:
+            return None
+        characters, common_words = markers
+        if any(character in characters for character in text):
+            return True
+        return all(word.lower() in common_words for word in words)
+
+    def is_target(self, texts):
+        """Devuelve un diccionario texto -> True si el texto ya está en el idioma de destino."""
+        with self.lock:
+            return self.classify(texts)
+
+    def classify(self, texts):
+        start = time.perf_counter()
+        results = {}
+        unknown = []
+        for text in dict.fromkeys(texts):
+            self.texts += 1
+            if text in self.cache:
+                self.cache_hits += 1
+                results[text] = self.cache[text]
+                continue
+            words = WORD_PATTERN.findall(text)
+            if len(words) < self.short_words:
+                results[text] = bool(self.classify_short(text, words))
+            else:
+                unknown.append(text)
+
+        if unknown:
+            self.detected += len(unknown)
+            for text, language in zip(unknown, self.detector(unknown)):
+                results[text] = language == self.target_language
+
+        if len(self.cache) + len(results) > self.max_cache_entries:
+            self.cache.clear()
+        self.cache.update(results)
+        self.seconds += time.perf_counter() - start
+        return results
+
+    def dominant_language(self, texts, sample=50):
+        """Idioma más frecuente entre los textos largos de la muestra (para elegir el modelo), o None."""
+        texts = [text for text in dict.fromkeys(texts) if len(WORD_PATTERN.findall(text)) >= self.short_words][:sample]
+        if not texts:
+            return None
+        with self.lock:
+            languages = [language for language in self.detector(texts) if language]
+        return max(set(languages), key=languages.count) if languages else None
+
+    def stats(self):
+        return {'seconds': self.seconds, 'texts': self.texts, 'cache_hits': self.cache_hits, 'detected': self.detected}
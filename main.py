@@ -3,30 +3,40 @@
 import sys
 import re
 import os
+import time
+import hashlib
+import argparse
+import itertools
 import subprocess
-from PyQt6.QtWidgets import QApplication, QMessageBox
-from gui import TranslatorApp
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
-from langdetect import detect, LangDetectException
+from collections import Counter
+from translation_memory import TranslationMemory
+from language_id import LanguageIdentifier
+from rpy_lexer import lex_lines, split_runs, is_markup, escape_string
+from journal import source_signature, open_journal, write_record, finalize_journal
+from pipeline_stats import PipelineStats, count_tokens, padded_size
+from placeholders import mask_markup, unmask_markup
 
 # Palabras clave especiales de Ren'Py
-SPECIAL_KEYWORDS = ["define", "label", "scene", "show", "hide", "play", "stop", "pause", "queue", "window", "with", "menu", "jump", "call", "return", "if", "elif", "else"]
+SPECIAL_KEYWORDS = frozenset(["define", "label", "scene", "show", "hide", "play", "stop", "pause", "queue", "window", "with", "menu", "jump", "call", "return", "if", "elif", "else"])
 
-def is_text_in_target_language(text, target_language_code):
-    try:
-        detected_language = detect(text)
-        return detected_language == target_language_code
-    except LangDetectException:
-        return False
+# Filtro de idioma por defecto: las líneas que ya están en español no se traducen
+DEFAULT_LANGUAGE_ID = LanguageIdentifier("es")
 
-def should_translate_line(line):
-    """Determina si una línea debe ser traducida o no."""
-    stripped_line = line.strip()
-    if any(stripped_line.startswith(keyword) for keyword in SPECIAL_KEYWORDS):
+def should_translate_line(ir, masking=False):
+    """Determina si una línea (ya pasada por el lexer) debe ser traducida o no.
+
+    Las líneas con corchetes o llaves solo se traducen con el marcado
+    enmascarado, y solo si todos están dentro de la cadena de diálogo: fuera de
+    ella (o en una línea $ de Python) son código, como persistent.flags["..."].
+    """
+    if ir.keyword in SPECIAL_KEYWORDS:
         return False
-    if '{' in stripped_line or '}' in stripped_line or '[' in stripped_line or ']' in stripped_line:
+    if not ir.has_brackets:
+        return True
+    if not masking or ir.stripped.startswith('$'):
         return False
-    return True
+    span = ir.dialogue_string()
+    return span is not None and ir.brackets_inside(span)
 
 def read_lines_with_fallback(file_path, encodings=['utf-8', 'latin-1', 'iso-8859-1']):
     """Intenta leer un archivo con diferentes codificaciones hasta que tenga éxito."""
@@ -40,162 +50,819 @@ def read_lines_with_fallback(file_path, encodings=['utf-8', 'latin-1', 'iso-8859
     with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
         return file.readlines()
 
+def detect_encoding(file_path, encodings=['utf-8', 'latin-1', 'iso-8859-1']):
+    """Como read_lines_with_fallback, pero leyendo por bloques sin cargar el archivo entero."""
+    for encoding in encodings:
+        try:
+            with open(file_path, 'r', encoding=encoding) as file:
+                while file.read(1 << 20):
+                    pass
+            return encoding, 'strict'
+        except UnicodeDecodeError:
+            continue
+    return 'utf-8', 'ignore'
+
+def iter_lines_with_fallback(file_path):
+    """Devuelve las líneas del archivo una a una, con la misma elección de codificación."""
+    encoding, errors = detect_encoding(file_path)
+    with open(file_path, 'r', encoding=encoding, errors=errors) as file:
+        yield from file
+
+def iter_line_chunks(lines, chunk_lines):
+    """Agrupa las líneas en bloques sin separar nunca un "translate CUSTOM" de la línea que le sigue."""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_lines and not chunk[-1].strip().startswith("translate CUSTOM"):
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Caracteres por token aproximados del tokenizador de Marian con texto en inglés
+CHARS_PER_TOKEN = 4
+# Cuánto más larga que la entrada se espera que salga la traducción
+OUTPUT_LENGTH_RATIO = 1.5
+
+BRACKET_VARIABLE_PATTERN = re.compile(r'\[([^\]]+)\]')
+HTML_TAG_PATTERN = re.compile(r'(<[^>]+>)')
+
 def ensure_spaces_around_brackets(text):
     """Asegura que haya espacios alrededor de las variables en corchetes."""
-    text = re.sub(r'\[([^\]]+)\]', r' [\1] ', text)
+    text = BRACKET_VARIABLE_PATTERN.sub(r' [\1] ', text)
     return text
 
 def preserve_html_colors(text):
     """Preserva los colores HTML dentro de las frases."""
-    return re.sub(r'(<[^>]+>)', r' \1 ', text)
+    return HTML_TAG_PATTERN.sub(r' \1 ', text)
 
-def translate_text_in_file(file_path, tokenizer, model, device, max_length, num_beams, temperature, repetition_penalty, length_penalty, no_repeat_ngram_size, progress_callback):
-    lines = read_lines_with_fallback(file_path)
+def make_entry(slot, kind, ir, span, variable=None, masking=False):
+    """Describe el hueco a traducir: la cadena span de la línea ir.
 
+    Con masking, si el texto tiene marcado se traduce entero como un solo
+    fragmento con las etiquetas cambiadas por #1, #2... (runs guarda las etiquetas).
+    """
+    text = ir.string_value(span).strip()
+    masked = mask_markup(text) if masking else None
+    if masked is not None:
+        return {
+            'slot': slot,
+            'kind': kind,
+            'line': ir.text,
+            'indent': ir.indent,
+            'prefix': ir.text[:span[0]],
+            'suffix': ir.text[span[1]:].rstrip(),
+            'variable': variable,
+            'text': text,
+            'fragments': [masked[0]],
+            'runs': masked[1],
+        }
+    return {
+        'slot': slot,
+        'kind': kind,
+        'line': ir.text,
+        'indent': ir.indent,
+        'prefix': ir.text[:span[0]],
+        'suffix': ir.text[span[1]:].rstrip(),
+        'variable': variable,
+        'text': text,
+        'fragments': split_runs(text),
+        'runs': None,
+    }
+
+def collect_segments(lines, language_id=None, stats=None, masking=False):
+    """Primera fase: recorre el archivo y recoge las líneas que hay que traducir.
+
+    Devuelve la lista de líneas de salida (con None en los huecos pendientes de
+    traducir) y la lista de entradas que describen cada hueco. Las que ya están
+    en el idioma de destino se descartan con language_id (un LanguageIdentifier).
+    """
+    stats = stats or PipelineStats()
+    with stats.stage('parse'):
+        translated_lines, entries = parse_segments(lines, masking)
+
+    # Las líneas que ya están en el idioma de destino se dejan tal cual, decidido en un solo lote
+    with stats.stage('language_id'):
+        in_target = (language_id or DEFAULT_LANGUAGE_ID).is_target([entry['text'] for entry in entries])
+    pending = []
+    for entry in entries:
+        if in_target[entry['text']]:
+            translated_lines[entry['slot']] = entry['line']
+        else:
+            pending.append(entry)
+
+    return translated_lines, pending
+
+def parse_segments(lines, masking=False):
+    """Pasa el lexer por las líneas y crea una entrada por cada cadena traducible."""
     translated_lines = []
-    total_lines = len(lines)
-    if progress_callback:
-        progress_callback(0)
+    entries = []
+    irs = lex_lines(lines)
+    total_lines = len(irs)
 
     index = 0
     while index < total_lines:
-        line = lines[index]
-        stripped_line = line.strip()
+        ir = irs[index]
+        line = ir.text
 
-        if not should_translate_line(line):
+        if not should_translate_line(ir, masking):
             translated_lines.append(line)
             index += 1
             continue
 
-        if stripped_line.startswith("translate CUSTOM"):
-            variable_name = stripped_line.split()[2].strip(":")
+        words = ir.stripped.split()
+        if ir.keyword == "translate" and len(words) > 2 and words[1] == "CUSTOM":
+            variable_name = words[2].strip(":")
             translated_lines.append(line)
             index += 1
 
             if index < total_lines:
-                next_line = lines[index]
-                stripped_next_line = next_line.strip()
-                if stripped_next_line.startswith("#") or stripped_next_line.startswith("translate"):
-                    translated_lines.append(next_line)
-                elif '"' in stripped_next_line and not stripped_next_line.startswith("old"):
-                    parts = stripped_next_line.split('"')
-                    if len(parts) > 1:
-                        original_text = parts[1].strip()
-
-                        if is_text_in_target_language(original_text, "es"):
-                            translated_lines.append(next_line)
-                        else:
-                            try:
-                                original_text_parts = re.split(r'(\[.*?\]|\{.*?\}|\<.*?\>)', original_text)
-                                translated_text_parts = []
-                                for part in original_text_parts:
-                                    if re.match(r'[\[\]\{\}\<\>]', part):
-                                        translated_text_parts.append(part)
-                                    else:
-                                        inputs = tokenizer(part, return_tensors="pt").to(device)
-                                        translated_ids = model.generate(
-                                            inputs["input_ids"],
-                                            max_length=max_length,
-                                            num_beams=num_beams,
-                                            temperature=temperature,
-                                            repetition_penalty=repetition_penalty,
-                                            length_penalty=length_penalty,
-                                            no_repeat_ngram_size=no_repeat_ngram_size,
-                                            early_stopping=True
-                                        )
-                                        translated_text = tokenizer.decode(translated_ids[0], skip_special_tokens=True)
-                                        translated_text_parts.append(translated_text)
-
-                                translated_text = ''.join(translated_text_parts)
-                                translated_text = ensure_spaces_around_brackets(translated_text)
-                                translated_text = preserve_html_colors(translated_text)
-                            except Exception as e:
-                                translated_text = f'{original_text}  # Error: {str(e)}'
-
-                            indentation = next_line[:next_line.index(stripped_next_line)]
-                            translated_line = f'{indentation}translate CUSTOM {variable_name}:\n'
-                            translated_line += f'{indentation}    "{translated_text}"\n'
-                            translated_lines.append(translated_line)
-                    else:
-                        translated_lines.append(next_line)
+                next_ir = irs[index]
+                if next_ir.is_comment or next_ir.keyword == "translate":
+                    translated_lines.append(next_ir.text)
+                elif next_ir.strings and next_ir.keyword != "old":
+                    entries.append(make_entry(len(translated_lines), 'custom', next_ir, next_ir.strings[0], variable_name, masking))
+                    translated_lines.append(None)
                 else:
-                    translated_lines.append(next_line)
-            else:
-                translated_lines.append(line)
-        elif stripped_line.startswith("#") or stripped_line.startswith("translate"):
+                    translated_lines.append(next_ir.text)
+        elif ir.is_comment or ir.keyword == "translate":
+            translated_lines.append(line)
+        elif ir.strings and ir.keyword != "old":
+            entries.append(make_entry(len(translated_lines), 'dialogue', ir, ir.dialogue_string(), masking=masking))
+            translated_lines.append(None)
+        else:
             translated_lines.append(line)
+
+        index += 1
+
+    return translated_lines, entries
+
+def needs_translation(part):
+    """Los fragmentos de marcado y los que solo tienen espacios se copian tal cual."""
+    return bool(part.strip()) and not is_markup(part)
+
+def segment_texts(entries):
+    """Devuelve los fragmentos de texto (sin etiquetas) de las entradas, sin repetir."""
+    texts = []
+    seen = set()
+    for entry in entries:
+        for part in entry['fragments']:
+            if needs_translation(part) and part not in seen:
+                seen.add(part)
+                texts.append(part)
+    return texts
+
+def encode_batch(texts, tokenizer, device, stats):
+    with stats.stage('tokenize'):
+        inputs = tokenizer(texts, return_tensors="pt", padding=True).to(device)
+    stats.add('tokens_in', count_tokens(inputs['attention_mask']))
+    stats.add('padded_tokens', padded_size(inputs['attention_mask']))
+    stats.record_padding(texts, inputs['attention_mask'])
+    return inputs
+
+def decode_batch(translated_ids, tokenizer, stats):
+    with stats.stage('decode'):
+        results = tokenizer.batch_decode(translated_ids, skip_special_tokens=True)
+    stats.add('tokens_out', count_tokens(translated_ids, getattr(tokenizer, 'pad_token_id', None) or 0))
+    return results
+
+def generate_batch(texts, tokenizer, model, device, generation_kwargs, stats=None):
+    """Traduce un lote de textos con una sola llamada a model.generate."""
+    stats = stats or PipelineStats()
+    inputs = encode_batch(texts, tokenizer, device, stats)
+    with stats.stage('generate'):
+        translated_ids = model.generate(**inputs, **generation_kwargs)
+    return decode_batch(translated_ids, tokenizer, stats)
+
+def make_batches(texts, batch_size, chunk_size=None):
+    """Agrupa los textos en lotes; dentro de cada bloque de chunk_size textos se ordenan por longitud."""
+    chunk_size = chunk_size or len(texts) or 1
+    batches = []
+    for start in range(0, len(texts), chunk_size):
+        ordered = sorted(texts[start:start + chunk_size], key=len, reverse=True)
+        batches.extend(ordered[i:i + batch_size] for i in range(0, len(ordered), batch_size))
+    return batches
+
+def estimate_tokens(text):
+    """Tokens aproximados de un texto sin pasar por el tokenizador (incluye el de fin de frase)."""
+    return len(text) // CHARS_PER_TOKEN + 2
+
+def batch_token_cost(rows, input_tokens, num_beams, max_length):
+    """Tokens que ocupa un lote: cada fila y cada haz guardan la entrada con relleno y la salida esperada."""
+    expected_output = min(max_length, int(input_tokens * OUTPUT_LENGTH_RATIO) + 8)
+    return rows * num_beams * (input_tokens + expected_output)
+
+def make_token_batches(texts, batch_size, max_tokens, num_beams=1, max_length=512, chunk_size=None):
+    """Como make_batches, pero cerrando cada lote cuando su coste supera max_tokens.
+
+    Los textos van de más largo a más corto, así que el primero de cada lote
+    marca el relleno de todos. Un texto que por sí solo supera el presupuesto
+    va en un lote para él. batch_size sigue siendo el máximo de filas.
+    """
+    chunk_size = chunk_size or len(texts) or 1
+    batches = []
+    for start in range(0, len(texts), chunk_size):
+        batch = []
+        width = 0
+        for text in sorted(texts[start:start + chunk_size], key=len, reverse=True):
+            if batch and (len(batch) >= batch_size or batch_token_cost(len(batch) + 1, width, num_beams, max_length) > max_tokens):
+                batches.append(batch)
+                batch = []
+            if not batch:
+                width = estimate_tokens(text)
+            batch.append(text)
+        if batch:
+            batches.append(batch)
+    return batches
+
+def is_out_of_memory(error):
+    message = str(error).lower()
+    return isinstance(error, MemoryError) or 'out of memory' in message or "can't allocate memory" in message
+
+def release_memory():
+    # torch ya está cargado si se ha llegado a generar; no se importa solo para esto
+    torch = sys.modules.get('torch')
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+def generate_splitting(batch, tokenizer, model, device, generation_kwargs, stats, max_rows=None):
+    """Traduce un lote; si no cabe en memoria se parte por la mitad y se reintenta.
+
+    Con max_rows el lote se parte a ese tamaño antes de probarlo. Devuelve
+    (traducciones o excepción, filas que caben), para partir así los siguientes.
+    """
+    rows = max_rows or len(batch)
+    parts = [batch[i:i + rows] for i in range(0, len(batch), rows)]
+    results = []
+    while parts:
+        part = parts.pop(0)
+        out_of_memory = False
+        try:
+            results.extend(generate_batch(part, tokenizer, model, device, generation_kwargs, stats))
+            continue
+        except Exception as e:
+            if not is_out_of_memory(e) or len(part) == 1:
+                return e, max_rows
+            out_of_memory = True
+        if out_of_memory:
+            # Fuera del except para que la traza ya no retenga los tensores del intento fallido
+            release_memory()
+            max_rows = len(part) // 2
+            parts[:0] = [part[:max_rows], part[max_rows:]]
+            stats.add('oom_splits')
+    return results, max_rows
+
+def run_batches(batches, tokenizer, model, device, generation_kwargs, should_stop=None, stats=None):
+    """Ejecuta los lotes uno a uno en este proceso. Devuelve (lote, traducciones o excepción).
+
+    Si un lote no cabe en memoria se parte por la mitad y se reintenta, y los
+    lotes siguientes ya se parten a ese tamaño antes de probarlos.
+    """
+    stats = stats or PipelineStats()
+    max_rows = None
+    for batch in batches:
+        if should_stop and should_stop():
+            return
+        results, max_rows = generate_splitting(batch, tokenizer, model, device, generation_kwargs, stats, max_rows)
+        yield batch, results
+
+def translate_segments(texts, tokenizer, model, device, generation_kwargs, batch_size=16, progress_callback=None, memory=None, model_name=None, should_stop=None, chunk_size=None, pool=None, stats=None, max_tokens=None, overlap=False, adaptive=False):
+    """Segunda fase: traduce los textos en lotes ordenados por longitud.
+
+    Devuelve un diccionario texto -> traducción. Si un lote falla, sus textos
+    quedan asociados a la excepción para que se marquen como error al montar la línea.
+    Si hay memoria de traducción, los textos ya conocidos no pasan por el modelo.
+    Con chunk_size solo se ordena por longitud dentro de cada bloque, respetando
+    el orden de entrada entre bloques. Con pool los lotes se reparten entre los
+    procesos de un CpuTranslationPool (mismos lotes, mismo resultado). Con
+    max_tokens los lotes se cierran por presupuesto de tokens en lugar de por
+    número de textos (batch_size pasa a ser solo el máximo). Con overlap el
+    lote siguiente se tokeniza y el anterior se decodifica en otros hilos
+    mientras el modelo genera (ver pipeline.run_batches_overlapped). Con
+    adaptive cada texto se traduce con los haces y el max_length de su
+    política (ver decoding_policy.py), en lotes separados por política.
+    progress_callback(done, total, textos_nuevos) se llama tras cada lote y
+    should_stop() se consulta antes de cada lote para poder cancelar.
+    """
+    stats = stats or PipelineStats()
+    translations = {}
+    total = len(texts)
+    if adaptive:
+        from decoding_policy import decoding_groups, record_policy
+        done = [0]
+
+        def report_group(_, __, batch):
+            done[0] += len(batch)
+            progress_callback(done[0], total, batch)
+
+        # Se agrupa dentro de cada bloque para mantener el orden entre bloques (los más frecuentes primero)
+        chunk = chunk_size or total or 1
+        for start in range(0, total, chunk):
+            for policy, policy_kwargs, group, tokens in decoding_groups(texts[start:start + chunk], generation_kwargs, tokenizer):
+                if should_stop and should_stop():
+                    return translations
+                record_policy(stats, policy, tokens, policy_kwargs, generation_kwargs)
+                generate_before = stats.seconds['generate']
+                translations.update(translate_segments(
+                    group, tokenizer, model, device, policy_kwargs, batch_size, report_group if progress_callback else None,
+                    memory, model_name, should_stop, None, pool, stats, max_tokens, overlap
+                ))
+                stats.add(f'{policy}_generate_seconds', stats.seconds['generate'] - generate_before)
+        return translations
+
+    if memory is not None:
+        if model_name is None:
+            model_name = getattr(model, 'name_or_path', type(model).__name__)
+        translations.update(memory.lookup(texts, model_name, generation_kwargs))
+        stats.add('memory_hits', len(translations))
+        if progress_callback and translations:
+            progress_callback(len(translations), total, list(translations))
+
+    remaining = [text for text in texts if text not in translations]
+    if max_tokens:
+        batches = make_token_batches(remaining, batch_size, max_tokens, generation_kwargs.get('num_beams', 1),
+                                     generation_kwargs.get('max_length', 512), chunk_size)
+    else:
+        batches = make_batches(remaining, batch_size, chunk_size)
+    if pool is not None:
+        # Los procesos del pool no comparten sus tiempos: la espera de cada lote cuenta como generate
+        results = stats.timed_iter(pool.translate_batches(batches, generation_kwargs, should_stop), 'generate')
+    elif overlap:
+        from pipeline import run_batches_overlapped
+        results = run_batches_overlapped(batches, tokenizer, model, device, generation_kwargs, should_stop, stats)
+    else:
+        results = run_batches(batches, tokenizer, model, device, generation_kwargs, should_stop, stats)
+
+    for batch, batch_results in results:
+        stats.add('segments', len(batch))
+        if isinstance(batch_results, Exception):
+            batch_results = [batch_results] * len(batch)
+        elif memory is not None:
+            memory.store(dict(zip(batch, batch_results)), model_name, generation_kwargs)
+        translations.update(zip(batch, batch_results))
+        if progress_callback:
+            progress_callback(len(translations), total, batch)
+    return translations
+
+def render_entry(entry, translations, stats=None):
+    """Monta la línea traducida de una entrada a partir de las traducciones."""
+    try:
+        if entry['runs'] is not None:
+            # Frase enmascarada: el modelo ya respetó los espacios, solo se devuelven las etiquetas
+            translated_text = translations[entry['fragments'][0]]
+            if isinstance(translated_text, Exception):
+                raise translated_text
+            translated_text = unmask_markup(translated_text, entry['runs'])
+            if translated_text is None:
+                raise ValueError("markup lost in translation")
         else:
-            if '"' in stripped_line and stripped_line.count('"') >= 2 and not stripped_line.startswith("old"):
-                parts = stripped_line.split('"')
-                if len(parts) >= 3:
-                    text_to_translate = parts[1].strip()
-
-                    if is_text_in_target_language(text_to_translate, "es"):
-                        translated_lines.append(line)
-                    else:
-                        try:
-                            text_parts = re.split(r'(\[.*?\]|\{.*?\}|\<.*?\>)', text_to_translate)
-                            translated_parts = []
-                            for part in text_parts:
-                                if re.match(r'[\[\]\{\}\<\>]', part):
-                                    translated_parts.append(part)
-                                else:
-                                    inputs = tokenizer(part, return_tensors="pt").to(device)
-                                    translated_ids = model.generate(
-                                        inputs["input_ids"],
-                                        max_length=max_length,
-                                        num_beams=num_beams,
-                                        temperature=temperature,
-                                        repetition_penalty=repetition_penalty,
-                                        length_penalty=length_penalty,
-                                        no_repeat_ngram_size=no_repeat_ngram_size,
-                                        early_stopping=True
-                                    )
-                                    translated_text = tokenizer.decode(translated_ids[0], skip_special_tokens=True)
-                                    translated_parts.append(translated_text)
-
-                            translated_text = ''.join(translated_parts)
-                            translated_text = ensure_spaces_around_brackets(translated_text)
-                            translated_text = preserve_html_colors(translated_text)
-                        except Exception as e:
-                            translated_text = f'{text_to_translate}  # Error: {str(e)}'
-
-                        indentation = line[:line.index(stripped_line)]
-                        translated_line = f'{indentation}{parts[0]}"{translated_text}"{parts[2]}\n'
-                        translated_lines.append(translated_line)
+            translated_parts = []
+            for part in entry['fragments']:
+                if not needs_translation(part):
+                    translated_parts.append(part)
                 else:
-                    translated_lines.append(line)
+                    translated_text = translations[part]
+                    if isinstance(translated_text, Exception):
+                        raise translated_text
+                    translated_parts.append(translated_text)
+
+            translated_text = ''.join(translated_parts)
+            translated_text = ensure_spaces_around_brackets(translated_text)
+            translated_text = preserve_html_colors(translated_text)
+    except Exception as e:
+        translated_text = f'{entry["text"]}  # Error: {str(e)}'
+        if stats is not None:
+            stats.add('errors')
+
+    translated_text = escape_string(translated_text)
+    if entry['kind'] == 'custom':
+        translated_line = f'{entry["indent"]}translate CUSTOM {entry["variable"]}:\n'
+        translated_line += f'{entry["indent"]}    "{translated_text}"\n'
+    else:
+        translated_line = f'{entry["prefix"]}"{translated_text}"{entry["suffix"]}\n'
+    return translated_line
+
+def load_translation_model(model_name, device, quantized=False, tokenizer=None, backend="torch"):
+    """Carga el tokenizador y el modelo con el motor indicado (ver inference_backends.py).
+
+    transformers, torch y onnxruntime se importan aquí y no al cargar el módulo:
+    tardan varios segundos y ni la ventana ni las herramientas de RPA/rpyc los
+    necesitan. La copia int8 siempre va en CPU. Con tokenizer se reutiliza uno
+    ya cargado (ver model_registry.py).
+    """
+    from inference_backends import get_backend
+    return get_backend(backend).load(model_name, device, quantized, tokenizer)
+
+def make_generation_kwargs(max_length, num_beams, temperature, repetition_penalty, length_penalty, no_repeat_ngram_size):
+    return dict(
+        max_length=max_length,
+        num_beams=num_beams,
+        temperature=temperature,
+        repetition_penalty=repetition_penalty,
+        length_penalty=length_penalty,
+        no_repeat_ngram_size=no_repeat_ngram_size,
+        early_stopping=True
+    )
+
+def entry_source_key(entry):
+    """Hash del texto original de una entrada (la línea, o el bloque "translate CUSTOM" completo)."""
+    if entry['kind'] == 'custom':
+        source = f'translate CUSTOM {entry["variable"]}:\n{entry["line"]}'
+    else:
+        source = entry['line']
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+def is_entry_translated(entry, translations):
+    """Indica si todos los fragmentos de la entrada se tradujeron sin error."""
+    for part in entry['fragments']:
+        if not needs_translation(part):
+            continue
+        if part not in translations or isinstance(translations[part], Exception):
+            return False
+    return True
+
+def fill_translated_lines(translated_lines, entries, translations, stats=None):
+    """Rellena los huecos pendientes con las traducciones.
+
+    Las líneas con algún fragmento sin traducir (traducción cancelada) se dejan como estaban.
+    """
+    stats = stats or PipelineStats()
+    with stats.stage('postprocess'):
+        for entry in entries:
+            if all(not needs_translation(part) or part in translations for part in entry['fragments']):
+                translated_lines[entry['slot']] = render_entry(entry, translations, stats)
             else:
-                translated_lines.append(line)
+                translated_lines[entry['slot']] = entry['line']
+    return translated_lines
 
-        index += 1
+def unmask_failures(entries, translations):
+    """Entradas enmascaradas cuya traducción perdió o desordenó alguna etiqueta.
+
+    Se pasan a la traducción por fragmentos (la de siempre) y se devuelven para
+    traducir esos fragmentos.
+    """
+    failed = []
+    for entry in entries:
+        if entry['runs'] is None:
+            continue
+        translation = translations.get(entry['fragments'][0])
+        if isinstance(translation, str) and unmask_markup(translation, entry['runs']) is None:
+            entry['fragments'] = split_runs(entry['text'])
+            entry['runs'] = None
+            failed.append(entry)
+    return failed
+
+def translate_file_streaming(file_path, translate_chunk, progress_callback=None, chunk_lines=500, should_stop=None, index=None, language_id=None, output_path=None, stats=None, masking=False):
+    """Traduce un archivo por bloques de líneas, apuntando cada bloque terminado en un diario.
+
+    translate_chunk(textos) devuelve el diccionario texto -> traducción de un
+    bloque. Al terminar, el resultado se escribe en un temporal que se renombra
+    sobre el original; si el proceso se corta, la siguiente ejecución continúa
+    desde el diario. Con un ProjectIndex, las líneas que ya se tradujeron en
+    otra ejecución se copian sin pasar por el modelo. Con output_path el
+    resultado se escribe ahí y el original no se toca. stats (un PipelineStats)
+    acumula los tiempos y contadores de cada etapa. Con masking las líneas con
+    marcado se traducen enteras (ver placeholders.py) y, si alguna etiqueta no
+    sobrevive, por fragmentos. Devuelve False si se canceló antes de terminar.
+    """
+    stats = stats or PipelineStats()
+    stats.current_file = file_path
+    signature = source_signature(file_path)
+    journal, lines_done = open_journal(file_path, signature, output_path)
+    total_size = max(signature['size'], 1)
+    read_size = 0
+    if progress_callback:
+        progress_callback(0)
+
+    lines = iter_lines_with_fallback(file_path)
+    try:
+        with stats.stage('read'):
+            for line in itertools.islice(lines, lines_done):
+                read_size += len(line)
+
+        for chunk in stats.timed_iter(iter_line_chunks(lines, chunk_lines), 'read'):
+            if should_stop and should_stop():
+                return False
+            translated_lines, entries = collect_segments(chunk, language_id, stats, masking)
+            stats.add('lines', len(chunk))
+            stats.add('skipped_lines', len(chunk) - len(entries))
+            if index is not None:
+                # Las entradas que no han cambiado desde la última vez se copian del índice
+                keys = [entry_source_key(entry) for entry in entries]
+                previous = index.lookup(keys)
+                for key, entry in zip(keys, entries):
+                    if key in previous:
+                        translated_lines[entry['slot']] = previous[key]
+                pending = [(key, entry) for key, entry in zip(keys, entries) if key not in previous]
+                entries = [entry for _, entry in pending]
+
+            texts = segment_texts(entries)
+            translations = translate_chunk(texts)
+            fallback = unmask_failures(entries, translations)
+            if fallback:
+                stats.add('mask_fallbacks', len(fallback))
+                texts.extend(segment_texts(fallback))
+                translations.update(translate_chunk(segment_texts(fallback)))
+            stats.count_file_padding(file_path, texts)
+            if should_stop and should_stop():
+                # El bloque puede haber quedado a medias: no se apunta y se repite al reanudar
+                return False
+            fill_translated_lines(translated_lines, entries, translations, stats)
+
+            if index is not None:
+                index.store({
+                    key: translated_lines[entry['slot']]
+                    for key, entry in pending if is_entry_translated(entry, translations)
+                })
+                index.count(len(keys) - len(pending), len(pending))
+                stats.add('reused_lines', len(keys) - len(pending))
+            with stats.stage('write'):
+                write_record(journal, len(chunk), translated_lines)
+
+            read_size += sum(len(line) for line in chunk)
+            if progress_callback:
+                progress_callback(min(int(read_size / total_size * 100), 99))
+    finally:
+        lines.close()
+        journal.close()
+
+    with stats.stage('write'):
+        finalize_journal(file_path, output_path)
+    stats.add('files')
+    if progress_callback:
+        progress_callback(100)
+    return True
+
+def translate_text_in_file(file_path, tokenizer, model, device, max_length, num_beams, temperature, repetition_penalty, length_penalty, no_repeat_ngram_size, progress_callback, batch_size=16, memory=None, chunk_lines=500, should_stop=None, index=None, language_id=None, output_path=None, stats=None, stats_path=None, max_tokens=None, masking=False, adaptive=False):
+    """Traduce un archivo. Con stats_path, al terminar se vuelcan las estadísticas (JSON, o Prometheus si acaba en .prom)."""
+    generation_kwargs = make_generation_kwargs(max_length, num_beams, temperature, repetition_penalty, length_penalty, no_repeat_ngram_size)
+    stats = stats or PipelineStats()
+
+    def translate_chunk(texts):
+        return translate_segments(texts, tokenizer, model, device, generation_kwargs, batch_size, None, memory, should_stop=should_stop, stats=stats, max_tokens=max_tokens, adaptive=adaptive)
+
+    completed = translate_file_streaming(file_path, translate_chunk, progress_callback, chunk_lines, should_stop, index, language_id, output_path, stats, masking)
+    if stats_path:
+        stats.dump(stats_path)
+    return completed
+
+def count_segment_occurrences(entries):
+    """Cuenta cuántas veces aparece cada fragmento traducible."""
+    counts = Counter()
+    for entry in entries:
+        for part in entry['fragments']:
+            if needs_translation(part):
+                counts[part] += 1
+    return counts
+
+def scan_entries(file_path, language_id, stats, index=None, masking=False, chunk_lines=500):
+    """Primera pasada de un archivo por bloques, sin guardar las líneas.
+
+    Por cada bloque devuelve (líneas que ya están en el índice del proyecto,
+    entradas que hay que traducir).
+    """
+    for chunk in stats.timed_iter(iter_line_chunks(iter_lines_with_fallback(file_path), chunk_lines), 'read'):
+        _, entries = collect_segments(chunk, language_id, stats, masking)
+        reused = 0
+        if index is not None:
+            # Lo que ya está en el índice del proyecto no hace falta traducirlo
+            keys = [entry_source_key(entry) for entry in entries]
+            previous = index.lookup(keys)
+            reused = sum(1 for key in keys if key in previous)
+            entries = [entry for key, entry in zip(keys, entries) if key not in previous]
+        yield reused, entries
+
+def translate_files(file_paths, tokenizer, model, device, max_length, num_beams, temperature, repetition_penalty, length_penalty, no_repeat_ngram_size, progress_callback, batch_size=16, memory=None, chunk_batches=8, should_stop=None, pool=None, model_name=None, chunk_lines=500, index=None, language_id=None, output_paths=None, stats=None, stats_path=None, max_tokens=None, masking=False, adaptive=False):
+    """Traduce varios archivos a la vez deduplicando los fragmentos de todo el proyecto.
+
+    Primero recoge los fragmentos de todos los archivos, traduce cada fragmento
+    distinto una sola vez (los más frecuentes primero, así una ejecución parcial
+    cubre el máximo de líneas) y luego reparte las traducciones a todas sus
+    apariciones. progress_callback recibe un diccionario con líneas y fragmentos
+    hechos/totales; si should_stop() devuelve True se para tras el lote en curso
+    y se escribe lo ya traducido. output_paths (original -> destino) permite
+    escribir en otra carpeta. Con stats_path las estadísticas por etapa se
+    vuelcan al terminar cada archivo. Devuelve un informe con el ahorro conseguido.
+    """
+    # Primera pasada: solo se guardan los recuentos, no las líneas, para no cargar los archivos en memoria
+    language_id = language_id or DEFAULT_LANGUAGE_ID
+    stats = stats or PipelineStats()
+    counts = Counter()
+    text_entries = {}
+    pending = []
+    # Frase enmascarada -> {texto original: etiquetas}, para comprobarlas tras traducir
+    masked_sources = {}
+    language_id_seconds = {}
+    for file_path in file_paths:
+        seconds_before = language_id.seconds
+        for reused, entries in scan_entries(file_path, language_id, stats, index, masking, chunk_lines):
+            pending.extend([0] * reused)
+            counts.update(count_segment_occurrences(entries))
+            for entry in entries:
+                if entry['runs'] is not None:
+                    masked_sources.setdefault(entry['fragments'][0], {})[entry['text']] = entry['runs']
+                fragments = {part for part in entry['fragments'] if needs_translation(part)}
+                for part in fragments:
+                    text_entries.setdefault(part, []).append(len(pending))
+                pending.append(len(fragments))
+        language_id_seconds[file_path] = language_id.seconds - seconds_before
+
+    generation_kwargs = make_generation_kwargs(max_length, num_beams, temperature, repetition_penalty, length_penalty, no_repeat_ngram_size)
+
+    unique_texts = [text for text, _ in counts.most_common()]
+    progress = {
+        'percent': 0,
+        'files': len(file_paths),
+        'lines_done': pending.count(0),
+        'lines_total': len(pending),
+        'segments_done': 0,
+        'segments_total': len(unique_texts),
+    }
+    if progress_callback:
+        progress_callback(dict(progress))
+
+    def report_batch(done, total, texts):
+        progress['segments_done'] += len(texts)
+        for text in texts:
+            for entry_id in text_entries[text]:
+                pending[entry_id] -= 1
+                if pending[entry_id] == 0:
+                    progress['lines_done'] += 1
+        progress['percent'] = int(progress['segments_done'] / progress['segments_total'] * 100)
         if progress_callback:
-            progress_callback(int((index + 1) / total_lines * 100))
+            progress_callback(dict(progress))
 
-    with open(file_path, 'w', encoding='utf-8') as file:
-        file.writelines(translated_lines)
+    translations = translate_segments(
+        unique_texts, tokenizer, model, device, generation_kwargs, batch_size, report_batch, memory,
+        model_name=model_name, should_stop=should_stop, chunk_size=batch_size * chunk_batches, pool=pool, stats=stats,
+        max_tokens=max_tokens, adaptive=adaptive
+    )
+
+    # Las frases enmascaradas que perdieron alguna etiqueta se traducen por fragmentos
+    fallback_texts = dict.fromkeys(
+        part
+        for masked, sources in masked_sources.items() if isinstance(translations.get(masked), str)
+        for text, runs in sources.items() if unmask_markup(translations[masked], runs) is None
+        for part in split_runs(text) if needs_translation(part) and part not in translations
+    )
+    if fallback_texts and not (should_stop and should_stop()):
+        translations.update(translate_segments(
+            list(fallback_texts), tokenizer, model, device, generation_kwargs, batch_size, None, memory,
+            model_name=model_name, should_stop=should_stop, chunk_size=batch_size * chunk_batches, pool=pool, stats=stats,
+            max_tokens=max_tokens, adaptive=adaptive
+        ))
+
+    # Segunda pasada: cada archivo se reescribe por bloques con las traducciones ya hechas
+    def translate_chunk(texts):
+        return {text: translations[text] for text in texts if text in translations}
+
+    output_paths = output_paths or {}
+    for file_path in file_paths:
+        translate_file_streaming(file_path, translate_chunk, chunk_lines=chunk_lines, index=index, language_id=language_id,
+                                 output_path=output_paths.get(file_path), stats=stats, masking=masking)
+        if stats_path:
+            stats.dump(stats_path)
+
+    occurrences = sum(counts.values())
+    return {
+        'files': len(file_paths),
+        'occurrences': occurrences,
+        'unique': len(unique_texts),
+        'saved': occurrences - len(unique_texts),
+        'saved_percent': (occurrences - len(unique_texts)) / occurrences * 100 if occurrences else 0.0,
+        'cancelled': bool(should_stop and should_stop()),
+        'lines_done': progress['lines_done'],
+        'lines_total': progress['lines_total'],
+        'reused_lines': index.reused if index is not None else 0,
+        'translated_lines': index.translated if index is not None else progress['lines_total'],
+        # Tiempo de detección de idioma de cada archivo (la segunda pasada sale de la caché)
+        'language_id_seconds': language_id_seconds,
+        # Fragmentos cuyo lote falló: sus líneas llevan el "# Error:" en el archivo
+        'errors': sum(1 for translation in translations.values() if isinstance(translation, Exception)),
+        # Tiempos por etapa y contadores de toda la ejecución
+        'stats': stats.snapshot(),
+    }
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    start_time = time.monotonic()
+    # PyQt solo se importa al lanzar la interfaz, así los procesos del pool pueden importar este módulo
+    from PyQt6.QtWidgets import QApplication, QMessageBox
+    from gui import TranslatorApp
+    from cpu_pool import CpuTranslationPool
+    from project_index import ProjectIndex, project_folder
+    from translation_server import TranslationClient, DEFAULT_SERVER_URL
+    from pipeline import translate_files_pipelined
+    from model_registry import ModelRegistry, DEFAULT_BUDGET_MB, translate_files_by_language
+    from inference_backends import BACKENDS, DEFAULT_BACKEND
+
+    parser = argparse.ArgumentParser(description="Translateador pofesioná")
+    parser.add_argument("--device", default="cuda", help="Dispositivo del modelo (cuda o cpu)")
+    parser.add_argument("--workers", type=int, default=0, help="Procesos de traducción en CPU (0 = un solo proceso)")
+    parser.add_argument("--quantized", action="store_true", help="Usar la copia int8 del modelo (solo CPU)")
+    parser.add_argument("--server", nargs="?", const=DEFAULT_SERVER_URL,
+                        help="Traducir con un translation_server.py ya arrancado en lugar de cargar el modelo aquí")
+    parser.add_argument("--model-budget-mb", type=int, default=DEFAULT_BUDGET_MB,
+                        help="Memoria máxima para los modelos cargados a la vez al detectar el idioma de origen (0 = sin límite)")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=sorted(BACKENDS),
+                        help="Motor de inferencia: PyTorch u ONNX Runtime (se exporta la primera vez)")
+    args, qt_args = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
 
     model_name = "Helsinki-NLP/opus-mt-en-es"
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForSeq2SeqLM.from_pretrained(model_name).to("cuda")
+    # El modelo int8 solo funciona en CPU
+    device = "cpu" if args.quantized else args.device
+    memory = TranslationMemory()
+    # Modelos de otros pares de idiomas, cargados cuando algún archivo los necesita
+    registry = ModelRegistry(device, args.quantized, args.model_budget_mb, backend=args.backend)
 
-    main_window = TranslatorApp(model_name, tokenizer, model, "cuda")
+    cpu_pool = {'pool': None}
+
+    def get_cpu_pool(workers):
+        """Crea (o recrea si cambia el número de procesos) el pool de CPU."""
+        pool = cpu_pool['pool']
+        quantized = main_window.quantized
+        if pool is not None and (pool.workers != workers or pool.quantized != quantized):
+            pool.shutdown()
+            pool = None
+        if pool is None and workers > 0 and device == "cpu":
+            pool = CpuTranslationPool(model_name, workers, quantized=quantized, backend=args.backend)
+        cpu_pool['pool'] = pool
+        return pool
+
+    project_indexes = {}
+
+    def get_project_index(file_paths):
+        """Índice del proyecto en la carpeta común de los archivos seleccionados."""
+        if not file_paths:
+            return None
+        folder = project_folder(file_paths)
+        if folder not in project_indexes:
+            project_indexes[folder] = ProjectIndex(folder)
+        index = project_indexes[folder]
+        index.reset_counters()
+        return index
+
+    def run_translate_files(file_paths, settings, progress_callback, should_stop):
+        settings = dict(settings)
+        workers = settings.pop('workers', 0)
+        run = translate_files_pipelined if settings.pop('pipelined', True) else translate_files
+        # Con --server el "modelo" es el cliente del servicio, que hace de pool
+        pool = main_window.model if args.server else get_cpu_pool(workers)
+        auto_model = settings.pop('auto_model', False)
+        if auto_model and pool is None:
+            # Cada archivo con el modelo de su idioma de origen; el de la ventana ya cuenta como cargado
+            registry.quantized = main_window.quantized
+            registry.add(model_name, main_window.tokenizer, main_window.model)
+            return translate_files_by_language(
+                run, file_paths, registry, DEFAULT_LANGUAGE_ID, model_name,
+                progress_callback=progress_callback,
+                should_stop=should_stop,
+                device=device,
+                memory=memory,
+                index=get_project_index(file_paths),
+                **settings
+            )
+        return run(
+            file_paths,
+            main_window.tokenizer,
+            main_window.model,
+            device,
+            progress_callback=progress_callback,
+            memory=memory,
+            should_stop=should_stop,
+            pool=pool,
+            index=get_project_index(file_paths),
+            # La memoria de traducción distingue las traducciones del modelo int8
+            model_name=f"{model_name}:int8" if main_window.quantized else model_name,
+            **settings
+        )
+
+    # La ventana se muestra ya y el modelo se carga en segundo plano; "Tranducir" se activa cuando está listo
+    main_window = TranslatorApp(model_name, None, None, device, memory, args.workers, args.quantized, start_time)
+    if args.server:
+        main_window.load_model = lambda use_quantized: (None, TranslationClient(args.server, model_name, use_quantized).load())
+    else:
+        main_window.load_model = lambda use_quantized: load_translation_model(model_name, device, use_quantized, backend=args.backend)
     main_window.translate_text_in_file = lambda file_path: translate_text_in_file(
         file_path,
-        tokenizer,
-        model,
-        "cuda",
+        main_window.tokenizer,
+        main_window.model,
+        device,
         main_window.max_length_slider.value(),
         main_window.num_beams_slider.value(),
         main_window.temperature_slider.value() / 10.0,
         main_window.repetition_penalty_slider.value() / 10.0,
         main_window.length_penalty_slider.value() / 10.0,
         main_window.no_repeat_ngram_size_slider.value(),
-        main_window.progress_bar.setValue
+        main_window.progress_bar.setValue,
+        main_window.batch_size_slider.value(),
+        memory
     )
+    main_window.translate_files = run_translate_files
+    main_window.start_model_loading(args.quantized)
 
-    sys.exit(app.exec())
-
+    exit_code = app.exec()
+    if cpu_pool['pool'] is not None:
+        cpu_pool['pool'].shutdown()
+    sys.exit(exit_code)
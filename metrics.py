@@ -0,0 +1,54 @@
+#!/usr/bin/python
+# metrics.py
+import math
+from collections import Counter
+
+def ngrams(tokens, n):
+    return Counter(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+
+def corpus_bleu(hypotheses, references, max_order=4):
+    """BLEU de corpus (0-100) con una referencia por frase y penalización por brevedad."""
+    matches = [0] * max_order
+    possible = [0] * max_order
+    hypothesis_length = 0
+    reference_length = 0
+    for hypothesis, reference in zip(hypotheses, references):
+        hypothesis_tokens = hypothesis.split()
+        reference_tokens = reference.split()
+        hypothesis_length += len(hypothesis_tokens)
+        reference_length += len(reference_tokens)
+        for n in range(1, max_order + 1):
+            hypothesis_ngrams = ngrams(hypothesis_tokens, n)
+            reference_ngrams = ngrams(reference_tokens, n)
+            matches[n - 1] += sum((hypothesis_ngrams & reference_ngrams).values())
+            possible[n - 1] += max(len(hypothesis_tokens) - n + 1, 0)
+
+    if hypothesis_length == 0 or min(matches) == 0:
+        return 0.0
+    log_precision = sum(math.log(matches[i] / possible[i]) for i in range(max_order)) / max_order
+    brevity_penalty = 1.0 if hypothesis_length > reference_length else math.exp(1 - reference_length / hypothesis_length)
+    return 100 * brevity_penalty * math.exp(log_precision)
+
+def corpus_chrf(hypotheses, references, max_order=6, beta=2):
+    """chrF de corpus (0-100): F-score de n-gramas de caracteres, sin contar espacios."""
+    precisions = []
+    recalls = []
+    for n in range(1, max_order + 1):
+        matched = hypothesis_total = reference_total = 0
+        for hypothesis, reference in zip(hypotheses, references):
+            hypothesis_ngrams = ngrams(hypothesis.replace(' ', ''), n)
+            reference_ngrams = ngrams(reference.replace(' ', ''), n)
+            matched += sum((hypothesis_ngrams & reference_ngrams).values())
+            hypothesis_total += sum(hypothesis_ngrams.values())
+            reference_total += sum(reference_ngrams.values())
+        if hypothesis_total and reference_total:
+            precisions.append(matched / hypothesis_total)
+            recalls.append(matched / reference_total)
+
+    if not precisions:
+        return 100.0 if all(h == r for h, r in zip(hypotheses, references)) else 0.0
+    precision = sum(precisions) / len(precisions)
+    recall = sum(recalls) / len(recalls)
+    if precision + recall == 0:
+        return 0.0
+    return 100 * (1 + beta ** 2) * precision * recall / (beta ** 2 * precision + recall)
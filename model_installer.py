@@ -2,12 +2,67 @@
 
 # The example is for french to spanish, but here -> https://github.com/Helsinki-NLP/Opus-MT-train/tree/master/models -> you can chose another.
 
-from transformers import MarianMTModel, MarianTokenizer
+import io
+import os
+import sys
+import time
+import argparse
 
-def translate_text(model_name="Helsinki-NLP/opus-mt-fr-es", text=""):
-    # Load model and tokenizer
-    tokenizer = MarianTokenizer.from_pretrained(model_name)
-    model = MarianMTModel.from_pretrained(model_name)
+# Int8 copies of the models are cached here, one folder per model
+QUANTIZED_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "traductor", "int8")
+
+def quantized_model_path(model_name):
+    return os.path.join(QUANTIZED_CACHE_DIR, model_name.replace("/", "--"), "model_int8.pt")
+
+def quantize_model(model):
+    import torch
+    # Dynamic quantization: Linear weights stored in int8, activations quantized on the fly (CPU only)
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def load_model(model_name, quantized=False, device="cpu", tokenizer=None):
+    # torch and transformers are imported here so the onnx backend does not pay for them
+    import torch
+    from transformers import MarianMTModel, MarianTokenizer, AutoConfig
+    tokenizer = tokenizer or MarianTokenizer.from_pretrained(model_name)
+    if not quantized:
+        return tokenizer, MarianMTModel.from_pretrained(model_name).to(device).eval()
+
+    cache_path = quantized_model_path(model_name)
+    if os.path.isfile(cache_path):
+        # Build an empty int8 skeleton and fill it with the cached weights, no fp32 load needed
+        model = quantize_model(MarianMTModel(AutoConfig.from_pretrained(model_name)).eval())
+        model.load_state_dict(torch.load(cache_path, weights_only=False))
+    else:
+        model = quantize_model(MarianMTModel.from_pretrained(model_name).eval())
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        torch.save(model.state_dict(), cache_path)
+    # Quantized Linear layers only run on the CPU
+    return tokenizer, model.eval()
+
+def model_size_bytes(model):
+    import torch
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+_registry = {}
+
+def get_registry(backend="torch"):
+    # One registry per backend, shared by every translate_text call in this process; created on first use
+    if backend not in _registry:
+        from model_registry import ModelRegistry
+        _registry[backend] = ModelRegistry("cpu", backend=backend)
+    return _registry[backend]
+
+def translate_text(model_name="Helsinki-NLP/opus-mt-fr-es", text="", quantized=False, server=None, backend="torch"):
+    # With a running translation_server.py (argument or TRADUCTOR_SERVER) the model is not loaded here
+    from translation_server import TranslationClient, SERVER_ENV_VAR
+    server = server or os.environ.get(SERVER_ENV_VAR)
+    if server:
+        return TranslationClient(server, model_name, quantized).translate([text])[0]
+
+    # Models stay loaded between calls (see model_registry.py), so only the first call per model pays the load
+    tokenizer, model = get_registry(backend).get(model_name, quantized)
 
     # Tokenize the text
     tokens = tokenizer(text, return_tensors="pt", padding=True)
@@ -19,8 +74,73 @@ def translate_text(model_name="Helsinki-NLP/opus-mt-fr-es", text=""):
     translation = tokenizer.decode(translated_tokens[0], skip_special_tokens=True)
     return translation
 
+def sample_rpy_texts(file_paths, limit=200):
+    # Same fragments the translator would send to the model
+    from main import read_lines_with_fallback, collect_segments, segment_texts
+    texts = []
+    for file_path in file_paths:
+        _, entries = collect_segments(read_lines_with_fallback(file_path))
+        texts.extend(text for text in segment_texts(entries) if text.strip() and text not in texts)
+        if len(texts) >= limit:
+            break
+    return texts[:limit]
+
+def compare_quantized(model_name, texts, batch_size=16, generation_kwargs=None):
+    # Translate the same texts with the fp32 and int8 models and measure speed, size and drift
+    import torch
+    from main import generate_batch
+    from metrics import corpus_bleu, corpus_chrf
+    generation_kwargs = generation_kwargs or {}
+    results = {}
+    for quantized in (False, True):
+        tokenizer, model = load_model(model_name, quantized)
+        outputs = []
+        start = time.perf_counter()
+        with torch.inference_mode():
+            for i in range(0, len(texts), batch_size):
+                outputs.extend(generate_batch(texts[i:i + batch_size], tokenizer, model, "cpu", generation_kwargs))
+        results['int8' if quantized else 'fp32'] = {
+            'seconds': time.perf_counter() - start,
+            'size_mb': model_size_bytes(model) / 1e6,
+            'outputs': outputs,
+        }
+
+    fp32, int8 = results['fp32'], results['int8']
+    return {
+        'segments': len(texts),
+        'fp32_seconds': fp32['seconds'],
+        'int8_seconds': int8['seconds'],
+        'speedup': fp32['seconds'] / int8['seconds'] if int8['seconds'] else 0.0,
+        'fp32_size_mb': fp32['size_mb'],
+        'int8_size_mb': int8['size_mb'],
+        'memory_saving_percent': (1 - int8['size_mb'] / fp32['size_mb']) * 100,
+        # The fp32 output is the reference: 100 means no drift at all
+        'bleu_vs_fp32': corpus_bleu(int8['outputs'], fp32['outputs']),
+        'chrf_vs_fp32': corpus_chrf(int8['outputs'], fp32['outputs']),
+    }
+
 if __name__ == "__main__":
-    # Translate a sample text
-    sample_text = "Hello, how are you?"
-    translation = translate_text(text=sample_text)
-    print(f"Translation: {translation}")
+    from inference_backends import BACKENDS
+    parser = argparse.ArgumentParser(description="Download a Helsinki-NLP model and optionally build its int8 copy")
+    parser.add_argument("--model", default="Helsinki-NLP/opus-mt-fr-es")
+    parser.add_argument("--quantize", action="store_true", help="Build and cache the int8 copy of the model")
+    parser.add_argument("--compare", nargs="+", metavar="RPY", help="Compare fp32 vs int8 on lines taken from these .rpy files")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--backend", default="torch", choices=sorted(BACKENDS), help="Inference backend for the sample translation")
+    args = parser.parse_args()
+
+    if args.compare:
+        texts = sample_rpy_texts(args.compare, args.samples)
+        if not texts:
+            print("No translatable lines found.")
+            sys.exit(1)
+        report = compare_quantized(args.model, texts)
+        print(f"Segments: {report['segments']}")
+        print(f"Speed: fp32 {report['fp32_seconds']:.2f}s, int8 {report['int8_seconds']:.2f}s (x{report['speedup']:.2f})")
+        print(f"Size: fp32 {report['fp32_size_mb']:.1f} MB, int8 {report['int8_size_mb']:.1f} MB ({report['memory_saving_percent']:.1f}% less)")
+        print(f"Drift vs fp32: BLEU {report['bleu_vs_fp32']:.1f}, chrF {report['chrf_vs_fp32']:.1f}")
+    else:
+        # Translate a sample text
+        sample_text = "Hello, how are you?"
+        translation = translate_text(model_name=args.model, text=sample_text, quantized=args.quantize, backend=args.backend)
+        print(f"Translation: {translation}")
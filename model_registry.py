@@ -0,0 +1,210 @@
+#!/usr/bin/python
+# model_registry.py
+# Modelos Helsinki-NLP cargados bajo demanda y guardados en un LRU limitado por memoria, para
+# traducir juegos de varios idiomas de origen sin reiniciar ni volver a cargar los modelos.
+import time
+import threading
+from collections import OrderedDict
+
+from inference_backends import onnx_files_bytes
+from main import collect_segments, iter_lines_with_fallback, load_translation_model, release_memory, segment_texts
+from pipeline_stats import PipelineStats
+
+MODEL_TEMPLATE = "Helsinki-NLP/opus-mt-{source}-{target}"
+DEFAULT_BUDGET_MB = 2048
+# Códigos de langdetect que no coinciden con los de los modelos de Helsinki-NLP
+LANGUAGE_ALIASES = {'zh-cn': 'zh', 'zh-tw': 'zh'}
+
+def model_for_pair(source, target):
+    return MODEL_TEMPLATE.format(source=LANGUAGE_ALIASES.get(source, source), target=target)
+
+def model_memory_bytes(model):
+    """Memoria que ocupan los pesos del modelo (también los int8, que van empaquetados en tuplas).
+
+    Los modelos de ONNX Runtime no tienen state_dict: se cuenta lo que ocupan sus .onnx.
+    """
+    if not hasattr(model, 'state_dict'):
+        folder = getattr(model, 'onnx_folder', None)
+        return onnx_files_bytes(folder) if folder else 0
+    total = 0
+    for value in model.state_dict().values():
+        for tensor in value if isinstance(value, tuple) else (value,):
+            if hasattr(tensor, 'element_size'):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+class ModelRegistry:
+    """Modelos cargados, del menos al más usado recientemente.
+
+    get() devuelve el modelo si ya está cargado y si no lo carga; cuando la
+    suma de los modelos pasa de budget_mb se descargan los que llevan más
+    tiempo sin usarse (el recién pedido nunca). Los tokenizadores se quedan
+    aunque su modelo se descargue, así volver a un idioma no los relee.
+    """
+
+    def __init__(self, device="cpu", quantized=False, budget_mb=DEFAULT_BUDGET_MB, loader=None, backend="torch"):
+        self.device = device
+        self.quantized = quantized
+        self.budget_mb = budget_mb
+        self.backend = backend
+        self.loader = loader or self.load
+        self.models = OrderedDict()
+        self.tokenizers = {}
+        self.lock = threading.RLock()
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    def load(self, model_name, device, quantized, tokenizer=None):
+        return load_translation_model(model_name, device, quantized, tokenizer, self.backend)
+
+    def key(self, model_name, quantized):
+        return f"{model_name}:int8" if quantized else model_name
+
+    def add(self, model_name, tokenizer, model, quantized=None):
+        """Registra un modelo cargado por otro lado (p. ej. el de la ventana al arrancar)."""
+        quantized = self.quantized if quantized is None else quantized
+        with self.lock:
+            self.tokenizers[model_name] = tokenizer
+            self.models[self.key(model_name, quantized)] = {'tokenizer': tokenizer, 'model': model, 'bytes': model_memory_bytes(model)}
+            self.evict(keep=self.key(model_name, quantized))
+
+    def get(self, model_name, quantized=None):
+        """Devuelve (tokenizador, modelo), cargándolo si no está en memoria."""
+        quantized = self.quantized if quantized is None else quantized
+        key = self.key(model_name, quantized)
+        with self.lock:
+            if key in self.models:
+                self.hits += 1
+                self.models.move_to_end(key)
+                entry = self.models[key]
+                return entry['tokenizer'], entry['model']
+
+            start = time.perf_counter()
+            device = "cpu" if quantized else self.device
+            tokenizer, model = self.loader(model_name, device, quantized, tokenizer=self.tokenizers.get(model_name))
+            self.load_seconds += time.perf_counter() - start
+            self.loads += 1
+            self.tokenizers[model_name] = tokenizer
+            self.models[key] = {'tokenizer': tokenizer, 'model': model, 'bytes': model_memory_bytes(model)}
+            self.evict(keep=key)
+            return tokenizer, model
+
+    def resident_bytes(self):
+        return sum(entry['bytes'] for entry in self.models.values())
+
+    def evict(self, keep):
+        if not self.budget_mb:
+            return
+        for key in list(self.models):
+            if self.resident_bytes() <= self.budget_mb * 1024 * 1024:
+                break
+            if key != keep:
+                del self.models[key]
+                self.evictions += 1
+                release_memory()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'resident': list(self.models),
+                'resident_mb': self.resident_bytes() / 1024 / 1024,
+                'budget_mb': self.budget_mb,
+                'loads': self.loads,
+                'hits': self.hits,
+                'evictions': self.evictions,
+                'load_seconds': self.load_seconds,
+            }
+
+def detect_source_language(file_path, language_id, chunk_lines=500):
+    """Idioma de origen de un archivo a partir de su primer bloque de líneas por traducir."""
+    lines = []
+    for line in iter_lines_with_fallback(file_path):
+        lines.append(line)
+        if len(lines) >= chunk_lines:
+            break
+    _, entries = collect_segments(lines, language_id)
+    return language_id.dominant_language(segment_texts(entries))
+
+def group_files_by_model(file_paths, language_id, target_language, default_model):
+    """Reparte los archivos según el modelo que les toca por su idioma de origen (None -> default_model)."""
+    groups = {}
+    for file_path in file_paths:
+        source = detect_source_language(file_path, language_id)
+        if source is None or source == target_language:
+            model_name = default_model
+        else:
+            model_name = model_for_pair(source, target_language)
+        groups.setdefault(model_name, []).append(file_path)
+    return groups
+
+def translate_files_by_language(run, file_paths, registry, language_id, default_model, target_language="es",
+                                progress_callback=None, should_stop=None, warning_callback=None, **kwargs):
+    """Traduce cada grupo de archivos con el modelo de su par de idiomas.
+
+    run es translate_files o pipeline.translate_files_pipelined y kwargs sus
+    demás argumentos. Los modelos salen del registro, así que un par que ya
+    está en memoria no se vuelve a cargar. Si un par no tiene modelo en
+    Helsinki-NLP (o no se puede cargar), sus archivos se traducen con
+    default_model: queda apuntado en 'fallbacks' del informe y se avisa con
+    warning_callback(modelo detectado, error, archivos). Devuelve el informe de
+    run sumado para todos los grupos, con el modelo usado por archivo y las
+    estadísticas del registro.
+    """
+    groups = group_files_by_model(file_paths, language_id, target_language, default_model)
+    stats = kwargs.pop('stats', None) or PipelineStats()
+    totals = {key: 0 for key in ('occurrences', 'unique', 'saved', 'lines_done', 'lines_total', 'errors', 'reused_lines', 'translated_lines')}
+    totals['language_id_seconds'] = {}
+    models = {}
+    fallbacks = []
+    files_before = 0
+    for model_name, group in groups.items():
+        if should_stop and should_stop():
+            break
+        try:
+            tokenizer, model = registry.get(model_name)
+        except OSError as e:
+            # No existe ese par en Helsinki-NLP, o no se puede descargar (sin conexión)
+            fallbacks.append({'model': model_name, 'used': default_model, 'error': str(e), 'files': list(group)})
+            if warning_callback:
+                warning_callback(model_name, str(e), group)
+            model_name = default_model
+            tokenizer, model = registry.get(model_name)
+        models.update(dict.fromkeys(group, model_name))
+
+        def report_group(info, offset=dict(totals), files_before=files_before, group_files=len(group), model_name=model_name):
+            # Los grupos anteriores ya están terminados: sus líneas y fragmentos cuentan como hechos
+            info = dict(info)
+            info['lines_done'] += offset['lines_done']
+            info['lines_total'] += offset['lines_total']
+            info['segments_done'] += offset['unique']
+            info['segments_total'] += offset['unique']
+            info['percent'] = int((files_before + group_files * info['percent'] / 100) / len(file_paths) * 100)
+            info['files'] = len(file_paths)
+            info['model'] = model_name
+            progress_callback(info)
+
+        # La memoria de traducción distingue las traducciones del modelo int8
+        report = run(group, tokenizer, model, progress_callback=report_group if progress_callback else None,
+                     should_stop=should_stop, model_name=registry.key(model_name, registry.quantized),
+                     language_id=language_id, stats=stats, **kwargs)
+        for key in ('occurrences', 'unique', 'saved', 'lines_done', 'lines_total', 'errors'):
+            totals[key] += report[key]
+        totals['language_id_seconds'].update(report['language_id_seconds'])
+        # El índice del proyecto lleva la cuenta de toda la ejecución
+        totals['reused_lines'] = report['reused_lines']
+        totals['translated_lines'] = report['translated_lines']
+        files_before += len(group)
+
+    occurrences = totals['occurrences']
+    totals.update({
+        'files': len(file_paths),
+        'saved_percent': totals['saved'] / occurrences * 100 if occurrences else 0.0,
+        'cancelled': bool(should_stop and should_stop()),
+        'stats': stats.snapshot(),
+        'models': models,
+        'fallbacks': fallbacks,
+        'registry': registry.stats(),
+    })
+    return totals
@@ -0,0 +1,348 @@
+#!/usr/bin/python
+# pipeline.py
+# Traducción por etapas solapadas: hilos lectores que preparan los archivos siguientes, un hilo
+# para el modelo alimentado desde una cola acotada y otro que escribe los archivos terminados.
+import os
+import queue
+import threading
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from main import (
+    DEFAULT_LANGUAGE_ID, count_segment_occurrences, decode_batch, encode_batch, generate_splitting, is_out_of_memory,
+    make_generation_kwargs, release_memory, scan_entries, translate_file_streaming, translate_segments
+)
+from pipeline_stats import PipelineStats
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+_DONE = object()
+
+def prefetch(iterable, depth=2):
+    """Recorre iterable en un hilo aparte, con como mucho depth elementos esperando (contrapresión)."""
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_Failure(e))
+            return
+        put(_DONE)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+
+def ordered_map(function, items, workers=2, depth=4):
+    """Aplica function a items en varios hilos; devuelve los resultados en orden, con como mucho depth en curso."""
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = deque()
+    try:
+        for item in items:
+            futures.append(executor.submit(function, item))
+            if len(futures) >= depth:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+def run_batches_overlapped(batches, tokenizer, model, device, generation_kwargs, should_stop=None, stats=None, depth=2):
+    """Como main.run_batches, pero con la CPU y el modelo trabajando a la vez.
+
+    Un hilo tokeniza los lotes siguientes (como mucho depth por delante) y otro
+    decodifica el lote anterior mientras el modelo genera el actual. Un trozo
+    que no cabe en memoria se repite partiéndolo (main.generate_splitting) y los
+    lotes que aún no se han tokenizado ya se parten a la mitad de ese tamaño.
+    """
+    stats = stats or PipelineStats()
+    max_rows = [None]
+
+    def encoded():
+        for batch in batches:
+            if should_stop and should_stop():
+                return
+            rows = max_rows[0] or len(batch)
+            parts = []
+            for start in range(0, len(batch), rows):
+                part = batch[start:start + rows]
+                try:
+                    parts.append((part, encode_batch(part, tokenizer, device, stats)))
+                except Exception as e:
+                    parts = e
+                    break
+            yield batch, parts
+
+    def generate(part, inputs):
+        if max_rows[0] and len(part) > max_rows[0]:
+            # Tokenizado antes de saber que no cabía: se parte sin volver a probarlo entero
+            results, max_rows[0] = generate_splitting(part, tokenizer, model, device, generation_kwargs, stats, max_rows[0])
+            return results
+        out_of_memory = False
+        try:
+            with stats.stage('generate'):
+                translated_ids = model.generate(**inputs, **generation_kwargs)
+            return decoder.submit(decode_batch, translated_ids, tokenizer, stats)
+        except Exception as e:
+            if not is_out_of_memory(e) or len(part) == 1:
+                return e
+            out_of_memory = True
+        if out_of_memory:
+            # Fuera del except para que la traza ya no retenga los tensores del intento fallido
+            del inputs
+            release_memory()
+            stats.add('oom_splits')
+            results, max_rows[0] = generate_splitting(part, tokenizer, model, device, generation_kwargs, stats, len(part) // 2)
+            return results
+
+    def resolve(batch, parts):
+        results = []
+        for part in parts:
+            if isinstance(part, Future):
+                try:
+                    part = part.result()
+                except Exception as e:
+                    part = e
+            if isinstance(part, Exception):
+                return batch, part
+            results.extend(part)
+        return batch, results
+
+    decoder = ThreadPoolExecutor(max_workers=1)
+    previous = None
+    try:
+        for batch, parts in prefetch(encoded(), depth):
+            if should_stop and should_stop():
+                break
+            if isinstance(parts, Exception):
+                results = [parts]
+            else:
+                results = []
+                for part, inputs in parts:
+                    results.append(generate(part, inputs))
+                    if isinstance(results[-1], Exception):
+                        break
+            if previous is not None:
+                yield resolve(*previous)
+            previous = (batch, results)
+        if previous is not None:
+            yield resolve(*previous)
+    finally:
+        decoder.shutdown(wait=True)
+
+def scan_file(file_path, language_id, index=None, masking=False, chunk_lines=500):
+    """Primera pasada de un archivo en un hilo lector: qué fragmentos necesita y cuántas veces.
+
+    Solo se guardan los recuentos, no las líneas; el archivo se vuelve a leer al escribirlo.
+    """
+    stats = PipelineStats()
+    counts = Counter()
+    entries_count = 0
+    reused = 0
+    for chunk_reused, entries in scan_entries(file_path, language_id, stats, index, masking, chunk_lines):
+        reused += chunk_reused
+        counts.update(count_segment_occurrences(entries))
+        entries_count += len(entries)
+    return {
+        'file_path': file_path,
+        'size': os.path.getsize(file_path),
+        'counts': counts,
+        'entries': entries_count,
+        'reused': reused,
+        'stats': stats,
+    }
+
+def translate_files_pipelined(file_paths, tokenizer, model, device, max_length, num_beams, temperature, repetition_penalty, length_penalty, no_repeat_ngram_size, progress_callback, batch_size=16, memory=None, chunk_batches=8, should_stop=None, pool=None, model_name=None, chunk_lines=500, index=None, language_id=None, output_paths=None, stats=None, stats_path=None, max_tokens=None, masking=False, adaptive=False, readers=2, queue_chunks=4):
+    """Igual que main.translate_files, pero con las etapas solapadas en lugar de en dos pasadas.
+
+    Los hilos lectores leen y analizan los archivos siguientes mientras el
+    modelo traduce; los fragmentos nuevos van al hilo del modelo por una cola de
+    como mucho queue_chunks bloques (si el modelo va atrasado, la lectura espera)
+    y cada archivo se escribe en otro hilo en cuanto tiene todas sus
+    traducciones. Se pierde el orden por frecuencia de todo el proyecto, pero un
+    archivo terminado queda escrito aunque se cancele el resto. Devuelve el mismo
+    informe que translate_files.
+    """
+    language_id = language_id or DEFAULT_LANGUAGE_ID
+    stats = stats or PipelineStats()
+    output_paths = output_paths or {}
+    generation_kwargs = make_generation_kwargs(max_length, num_beams, temperature, repetition_penalty, length_penalty, no_repeat_ngram_size)
+    chunk_size = batch_size * chunk_batches
+
+    translations = {}
+    lock = threading.Lock()
+    # El modelo lo usa el hilo del modelo y, para los fragmentos de reserva del enmascarado, el escritor
+    model_lock = threading.Lock()
+    waiting = {}
+    remaining = {}
+    queued = set()
+    text_queue = queue.Queue(maxsize=queue_chunks)
+    write_queue = queue.Queue()
+    failures = []
+    language_id_seconds = {}
+    total_bytes = max(sum(os.path.getsize(file_path) for file_path in file_paths), 1)
+    progress = {
+        'percent': 0,
+        'files': len(file_paths),
+        'files_done': 0,
+        'lines_done': 0,
+        'lines_total': 0,
+        'segments_done': 0,
+        'segments_total': 0,
+    }
+    scanned_bytes = [0]
+    totals = {'occurrences': 0, 'file_entries': {}}
+
+    def report_progress():
+        segments = progress['segments_done'] / progress['segments_total'] if progress['segments_total'] else 1.0
+        percent = int(scanned_bytes[0] / total_bytes * segments * 100)
+        progress['percent'] = max(progress['percent'], min(percent, 99 if progress['files_done'] < len(file_paths) else 100))
+        if progress_callback:
+            progress_callback(dict(progress))
+
+    def report_batch(done, total, texts):
+        with lock:
+            progress['segments_done'] += len(texts)
+            report_progress()
+
+    def model_worker():
+        while True:
+            texts = text_queue.get()
+            if texts is None:
+                return
+            try:
+                with model_lock:
+                    results = translate_segments(
+                        texts, tokenizer, model, device, generation_kwargs, batch_size, report_batch, memory,
+                        model_name=model_name, should_stop=should_stop, chunk_size=chunk_size, pool=pool, stats=stats,
+                        max_tokens=max_tokens, overlap=True, adaptive=adaptive
+                    )
+            except Exception as e:
+                failures.append(e)
+                results = {text: e for text in texts}
+            with lock:
+                translations.update(results)
+                for text in results:
+                    for file_id in waiting.pop(text, ()):
+                        remaining[file_id] -= 1
+                        if remaining[file_id] == 0:
+                            write_queue.put(file_id)
+
+    def translate_chunk(texts):
+        # Normalmente ya está todo; solo faltan los fragmentos de frases enmascaradas que perdieron etiquetas
+        missing = [text for text in texts if text not in translations]
+        if missing and not (should_stop and should_stop()):
+            with model_lock:
+                translations.update(translate_segments(
+                    missing, tokenizer, model, device, generation_kwargs, batch_size, None, memory,
+                    model_name=model_name, should_stop=should_stop, pool=pool, stats=stats, max_tokens=max_tokens, adaptive=adaptive
+                ))
+        return {text: translations[text] for text in texts if text in translations}
+
+    def writer():
+        while True:
+            file_id = write_queue.get()
+            if file_id is None:
+                return
+            file_path = file_paths[file_id]
+            try:
+                # Un archivo en esta cola ya tiene todas sus traducciones: se escribe aunque se haya cancelado
+                completed = translate_file_streaming(file_path, translate_chunk, chunk_lines=chunk_lines, index=index,
+                                                     language_id=language_id, output_path=output_paths.get(file_path),
+                                                     stats=stats, masking=masking)
+            except Exception as e:
+                failures.append(e)
+                continue
+            if stats_path:
+                stats.dump(stats_path)
+            if completed:
+                with lock:
+                    progress['files_done'] += 1
+                    progress['lines_done'] += totals['file_entries'][file_id]
+                    report_progress()
+
+    model_thread = threading.Thread(target=model_worker, daemon=True)
+    writer_thread = threading.Thread(target=writer, daemon=True)
+    model_thread.start()
+    writer_thread.start()
+    try:
+        scans = ordered_map(
+            lambda file_path: scan_file(file_path, language_id, index, masking, chunk_lines),
+            file_paths, workers=readers, depth=readers + 1
+        )
+        for file_id, scan in enumerate(scans):
+            if should_stop and should_stop():
+                break
+            stats.merge(scan['stats'])
+            language_id_seconds[scan['file_path']] = scan['stats'].seconds['language_id']
+            with lock:
+                totals['occurrences'] += sum(scan['counts'].values())
+                totals['file_entries'][file_id] = scan['entries'] + scan['reused']
+                progress['lines_total'] += scan['entries'] + scan['reused']
+                scanned_bytes[0] += scan['size']
+                # Los más frecuentes del archivo primero
+                new_texts = [text for text, _ in scan['counts'].most_common() if text not in queued]
+                pending = [text for text in scan['counts'] if text not in translations]
+                queued.update(new_texts)
+                progress['segments_total'] += len(new_texts)
+                remaining[file_id] = len(pending)
+                for text in pending:
+                    waiting.setdefault(text, []).append(file_id)
+                if not pending:
+                    write_queue.put(file_id)
+                report_progress()
+            # put espera si la cola está llena: así la lectura no se adelanta demasiado al modelo
+            for start in range(0, len(new_texts), chunk_size):
+                text_queue.put(new_texts[start:start + chunk_size])
+    finally:
+        text_queue.put(None)
+        model_thread.join()
+        write_queue.put(None)
+        writer_thread.join()
+
+    if failures:
+        raise failures[0]
+
+    unique = len(queued)
+    occurrences = totals['occurrences']
+    return {
+        'files': len(file_paths),
+        'occurrences': occurrences,
+        'unique': unique,
+        'saved': occurrences - unique,
+        'saved_percent': (occurrences - unique) / occurrences * 100 if occurrences else 0.0,
+        'cancelled': bool(should_stop and should_stop()),
+        'lines_done': progress['lines_done'],
+        'lines_total': progress['lines_total'],
+        'reused_lines': index.reused if index is not None else 0,
+        'translated_lines': index.translated if index is not None else progress['lines_total'],
+        'language_id_seconds': language_id_seconds,
+        'errors': sum(1 for translation in translations.values() if isinstance(translation, Exception)),
+        'stats': stats.snapshot(),
+    }
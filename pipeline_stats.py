@@ -0,0 +1,222 @@
+#!/usr/bin/python
+# pipeline_stats.py
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# Etapas del pipeline, en el orden en que se recorren
+STAGES = ('read', 'parse', 'language_id', 'tokenize', 'generate', 'decode', 'postprocess', 'write')
+COUNTERS = ('files', 'lines', 'skipped_lines', 'reused_lines', 'segments', 'memory_hits', 'tokens_in', 'tokens_out',
+            'padded_tokens', 'oom_splits', 'mask_fallbacks', 'errors',
+            # Política de decodificación (decoding_policy.py) y trabajo estimado con y sin ella
+            'greedy_segments', 'reduced_segments', 'full_segments', 'baseline_decode_tokens', 'policy_decode_tokens',
+            # Segundos de generate medidos con cada política
+            'greedy_generate_seconds', 'reduced_generate_seconds', 'full_generate_seconds')
+
+def count_tokens(ids, pad_token_id=0):
+    """Tokens que no son relleno, tanto en tensores como en listas de listas."""
+    if hasattr(ids, 'ne'):
+        return int(ids.ne(pad_token_id).sum())
+    return sum(1 for row in ids for token in row if token != pad_token_id)
+
+def padded_size(ids):
+    """Posiciones de un lote contando el relleno (filas x columnas)."""
+    if hasattr(ids, 'numel'):
+        return int(ids.numel())
+    return sum(len(row) for row in ids)
+
+def row_sizes(mask):
+    """(tokens, posiciones con relleno) de cada fila de una máscara de atención."""
+    if hasattr(mask, 'sum') and hasattr(mask, 'shape'):
+        return [(int(tokens), int(mask.shape[1])) for tokens in mask.sum(dim=1).tolist()]
+    width = max((len(row) for row in mask), default=0)
+    return [(sum(1 for value in row if value), width) for row in mask]
+
+def prometheus_label(value):
+    """Valor de etiqueta de Prometheus: solo se escapan la barra invertida, las comillas y los saltos de línea."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def padding_efficiency(counters):
+    """Parte de las posiciones del lote que son tokens de verdad; None si no hay datos (p. ej. con pool)."""
+    return counters['tokens_in'] / counters['padded_tokens'] if counters['padded_tokens'] else None
+
+def decoding_work_saved(counters):
+    """Porcentaje de trabajo del decodificador que se ahorra la política frente a los ajustes fijos."""
+    baseline = counters['baseline_decode_tokens']
+    return (1 - counters['policy_decode_tokens'] / baseline) * 100 if baseline else 0.0
+
+class PipelineStats:
+    """Tiempos acumulados por etapa y contadores de una traducción.
+
+    Se mide por bloque o por lote, nunca por línea, para poder dejarlo siempre
+    activado. dump() escribe el estado actual en JSON o, si el archivo acaba en
+    .prom, en el formato de texto de Prometheus. Se puede usar desde varios
+    hilos a la vez; entonces los tiempos de etapas que se solapan se suman.
+    """
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.current_file = None
+        # Tokens y posiciones de cada texto en el lote en que se tradujo, y su suma por archivo
+        self.text_padding = {}
+        self.file_padding = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        stats = cls()
+        stats.seconds.update(snapshot['seconds'])
+        stats.counters.update(snapshot['counters'])
+        stats.current_file = snapshot['file']
+        for file_path, file_stats in snapshot.get('files', {}).items():
+            stats.file_padding[file_path] = [file_stats['tokens_in'], file_stats['padded_tokens']]
+        return stats
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.seconds[name] += elapsed
+
+    def add(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] += amount
+
+    def merge(self, other):
+        """Suma los tiempos y contadores de otro PipelineStats (p. ej. el de un hilo lector)."""
+        with self.lock:
+            for name, seconds in other.seconds.items():
+                self.seconds[name] += seconds
+            for counter, value in other.counters.items():
+                self.counters[counter] += value
+            self.text_padding.update(other.text_padding)
+            for file_path, (tokens, padded) in other.file_padding.items():
+                totals = self.file_padding.setdefault(file_path, [0, 0])
+                totals[0] += tokens
+                totals[1] += padded
+
+    def record_padding(self, texts, mask):
+        """Apunta el relleno que le tocó a cada texto de un lote, para repartirlo luego por archivos."""
+        sizes = row_sizes(mask)
+        with self.lock:
+            self.text_padding.update(zip(texts, sizes))
+
+    def count_file_padding(self, file_path, texts):
+        """Suma a file_path el relleno de los textos suyos que pasaron por el modelo.
+
+        Cada texto se cuenta una sola vez, en el primer archivo que lo escribe, y
+        se olvida; así text_padding solo guarda los textos que aún no se han escrito.
+        """
+        with self.lock:
+            totals = self.file_padding.setdefault(file_path, [0, 0])
+            for text in texts:
+                sizes = self.text_padding.pop(text, None)
+                if sizes is not None:
+                    totals[0] += sizes[0]
+                    totals[1] += sizes[1]
+
+    def timed_iter(self, iterable, name):
+        """Recorre iterable sumando a la etapa name el tiempo que tarda cada elemento en llegar."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.seconds[name] += elapsed
+                return
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.seconds[name] += elapsed
+            yield item
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'file': self.current_file,
+                'seconds': dict(self.seconds),
+                'total_seconds': sum(self.seconds.values()),
+                'counters': dict(self.counters),
+                'padding_efficiency': padding_efficiency(self.counters),
+                'decoding_work_saved_percent': decoding_work_saved(self.counters),
+                'files': {
+                    file_path: {'tokens_in': tokens, 'padded_tokens': padded,
+                                'padding_efficiency': tokens / padded if padded else None}
+                    for file_path, (tokens, padded) in self.file_padding.items()
+                },
+            }
+
+    def to_prometheus(self):
+        with self.lock:
+            seconds = dict(self.seconds)
+            counters = dict(self.counters)
+            file_padding = {file_path: tuple(totals) for file_path, totals in self.file_padding.items()}
+        lines = [
+            '# HELP traductor_stage_seconds_total Cumulative seconds spent in each pipeline stage.',
+            '# TYPE traductor_stage_seconds_total counter',
+        ]
+        lines.extend(f'traductor_stage_seconds_total{{stage="{stage}"}} {value:.6f}' for stage, value in seconds.items())
+        for counter, value in counters.items():
+            lines.append(f'# TYPE traductor_{counter}_total counter')
+            lines.append(f'traductor_{counter}_total {value}')
+        if any(padded for _, padded in file_padding.values()):
+            lines.append('# TYPE traductor_file_padding_efficiency gauge')
+            lines.extend(
+                f'traductor_file_padding_efficiency{{file="{prometheus_label(file_path)}"}} {tokens / padded:.6f}'
+                for file_path, (tokens, padded) in file_padding.items() if padded
+            )
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """Escribe las estadísticas de forma atómica, para que otro proceso nunca lea un archivo a medias."""
+        if path.endswith('.prom'):
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.snapshot(), indent=2, ensure_ascii=False) + '\n'
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        os.replace(temp_path, path)
+
+def format_summary(snapshot):
+    """Resumen con el peso de cada etapa a partir de PipelineStats.snapshot(), para la interfaz."""
+    seconds = snapshot['seconds']
+    total = snapshot['total_seconds'] or 1e-9
+    stages = ' | '.join(
+        f"{stage} {value:.2f}s ({value / total * 100:.0f}%)"
+        for stage, value in seconds.items() if value >= 0.005
+    )
+    counters = snapshot['counters']
+    efficiency = snapshot['padding_efficiency']
+    files = sorted(
+        (file_stats['padding_efficiency'], os.path.basename(file_path))
+        for file_path, file_stats in snapshot.get('files', {}).items() if file_stats['padding_efficiency'] is not None
+    )
+    return (
+        f"Stages: {stages or '-'}\n"
+        f"{counters['segments']} segments to the model, {counters['tokens_in']} tokens in / {counters['tokens_out']} out, "
+        f"{counters['skipped_lines']} lines skipped, {counters['errors']} errors, "
+        f"padding efficiency {f'{efficiency * 100:.0f}%' if efficiency is not None else '-'}"
+        + (f", {counters['oom_splits']} batches split after running out of memory" if counters['oom_splits'] else "")
+        + (f", {counters['mask_fallbacks']} masked lines retried by fragments" if counters['mask_fallbacks'] else "")
+        + (
+            f"\nPadding efficiency per file: {files[0][0] * 100:.0f}% ({files[0][1]}) to {files[-1][0] * 100:.0f}% ({files[-1][1]})"
+            if len(files) > 1 else ""
+        )
+        + (
+            f"\nDecoding: {counters['greedy_segments']} greedy ({counters['greedy_generate_seconds']:.1f}s), "
+            f"{counters['reduced_segments']} reduced beams ({counters['reduced_generate_seconds']:.1f}s), "
+            f"{counters['full_segments']} full beams ({counters['full_generate_seconds']:.1f}s); "
+            f"estimated ~{decoding_work_saved(counters):.0f}% fewer decoder tokens"
+            if counters['baseline_decode_tokens'] else ""
+        )
+    )
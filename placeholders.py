@@ -0,0 +1,40 @@
+#!/usr/bin/python
+# placeholders.py
+# Enmascarado del marcado de Ren'Py: [var], {tag} y <...> se cambian por #1, #2... para que el
+# modelo traduzca la frase entera de una vez, y luego se vuelven a poner en su sitio.
+import re
+from rpy_lexer import split_runs, is_markup, run_kind
+
+# Marian deja intactos los números; se acepta el espacio que a veces mete tras la almohadilla
+SENTINEL_PATTERN = re.compile(r'#\s?(\d+)')
+
+def mask_markup(text):
+    """Devuelve (texto enmascarado, etiquetas en orden), o None si no hay marcado o el texto ya tiene algo como "#1"."""
+    parts = split_runs(text)
+    runs = [part for part in parts if is_markup(part)]
+    if not runs or SENTINEL_PATTERN.search(text):
+        return None
+    masked = []
+    number = 0
+    for part in parts:
+        if is_markup(part):
+            number += 1
+            masked.append(f"#{number}")
+        else:
+            masked.append(part)
+    return ''.join(masked), runs
+
+def unmask_markup(translation, runs):
+    """Pone las etiquetas en la traducción.
+
+    Devuelve None si alguna marca se perdió o se duplicó, o si las etiquetas
+    {tag} y <...> cambiaron de orden (se romperían las parejas de apertura y
+    cierre). Las variables [var] sí pueden moverse.
+    """
+    found = [int(match.group(1)) for match in SENTINEL_PATTERN.finditer(translation)]
+    if sorted(found) != list(range(1, len(runs) + 1)):
+        return None
+    tags = [number for number in found if run_kind(runs[number - 1]) != 'var']
+    if tags != sorted(tags):
+        return None
+    return SENTINEL_PATTERN.sub(lambda match: runs[int(match.group(1)) - 1], translation)
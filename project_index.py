@@ -0,0 +1,72 @@
+#!/usr/bin/python
+# project_index.py
+import os
+import time
+import sqlite3
+import threading
+
+INDEX_FILE_NAME = ".traductor_index.db"
+
+def project_folder(file_paths):
+    """Carpeta común de los archivos de un proyecto, donde se guarda su índice."""
+    return os.path.commonpath([os.path.dirname(os.path.abspath(file_path)) for file_path in file_paths])
+
+class ProjectIndex:
+    """Índice por proyecto: hash de cada línea o bloque "translate" original -> su traducción.
+
+    Cuando el juego se actualiza y se vuelve a extraer la carpeta tl/, las líneas
+    que no han cambiado se copian del índice en vez de volver a pasar por el modelo.
+    """
+
+    def __init__(self, project_folder):
+        self.path = os.path.join(project_folder, INDEX_FILE_NAME)
+        self.reused = 0
+        self.translated = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS lines (key TEXT PRIMARY KEY, translation TEXT, updated REAL)"
+        )
+        self.connection.commit()
+
+    def lookup(self, keys):
+        """Devuelve un diccionario hash -> traducción anterior de las claves que ya están en el índice."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                found.update(self.connection.execute(
+                    f"SELECT key, translation FROM lines WHERE key IN ({placeholders})", chunk
+                ).fetchall())
+        return found
+
+    def store(self, translations):
+        """Guarda las traducciones nuevas (hash -> línea traducida)."""
+        now = time.time()
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO lines VALUES (?, ?, ?)",
+                [(key, translation, now) for key, translation in translations.items()]
+            )
+            self.connection.commit()
+
+    def count(self, reused, translated):
+        with self.lock:
+            self.reused += reused
+            self.translated += translated
+
+    def reset_counters(self):
+        with self.lock:
+            self.reused = 0
+            self.translated = 0
+
+    def stats(self):
+        with self.lock:
+            entries = self.connection.execute("SELECT COUNT(*) FROM lines").fetchone()[0]
+            return {'entries': entries, 'reused': self.reused, 'translated': self.translated}
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,218 @@
+#!/usr/bin/python
+# rpa.py
+# Lector de archivos .rpa de Ren'Py sin el programa unrpa: se mapea el archivo en memoria, se lee
+# el índice y se extraen solo las entradas que hacen falta (por defecto los scripts).
+import io
+import os
+import sys
+import json
+import mmap
+import time
+import zlib
+import codecs
+import pickle
+import fnmatch
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+SCRIPT_PATTERNS = ('*.rpy', '*.rpyc')
+CHUNK_SIZE = 1 << 20
+
+class RpaError(Exception):
+    pass
+
+class IndexUnpickler(pickle.Unpickler):
+    """El índice es un pickle: solo se aceptan datos simples, nunca clases ni funciones."""
+
+    # Con el protocolo 2, Python 3 guarda los bytes como llamadas a estas dos funciones
+    ALLOWED = {
+        ('_codecs', 'encode'): codecs.encode,
+        ('builtins', 'bytes'): bytes,
+        ('__builtin__', 'bytes'): bytes,
+    }
+
+    def find_class(self, module, name):
+        if (module, name) in self.ALLOWED:
+            return self.ALLOWED[(module, name)]
+        raise RpaError(f"Unexpected object {module}.{name} in the archive index")
+
+def parse_header(header):
+    """Devuelve (versión, posición del índice, clave XOR) a partir de la primera línea."""
+    fields = header.split()
+    if not fields:
+        raise RpaError("Empty archive")
+    version = fields[0].decode('ascii', 'replace')
+    if version.startswith('RPA-3.'):
+        # La clave es el XOR de todos los campos tras la posición (así se leen también las variantes 3.x)
+        key = 0
+        for field in fields[2:]:
+            key ^= int(field, 16)
+        return version, int(fields[1], 16), key
+    if version == 'RPA-2.0':
+        return version, int(fields[1], 16), 0
+    raise RpaError(f"Unsupported archive format {version!r}")
+
+def normalize_entry(name, parts, key):
+    # Los archivos de Ren'Py 7 (Python 2) traen bytes donde los nuevos traen str
+    if isinstance(name, bytes):
+        name = name.decode('utf-8')
+    entries = []
+    for part in parts:
+        offset, length = part[0] ^ key, part[1] ^ key
+        prefix = part[2] if len(part) > 2 else b''
+        if isinstance(prefix, str):
+            prefix = prefix.encode('latin-1')
+        entries.append((offset, length, prefix))
+    return name, entries
+
+def safe_path(destination, name):
+    """Ruta de destino de una entrada, sin dejar que se salga de la carpeta (rutas absolutas o "..")."""
+    path = os.path.normpath(os.path.join(destination, name.replace('\\', '/').lstrip('/')))
+    if os.path.commonpath([os.path.abspath(destination), os.path.abspath(path)]) != os.path.abspath(destination):
+        raise RpaError(f"Entry {name!r} points outside the destination folder")
+    return path
+
+class RpaArchive:
+    """Un archivo .rpa abierto. Las entradas se leen del mapa en memoria, sin cargar el archivo entero."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise RpaError("Empty archive") from None
+        try:
+            header_end = self.map.find(b'\n', 0, 256)
+            self.version, index_offset, key = parse_header(self.map[:header_end if header_end > 0 else 256])
+            raw_index = zlib.decompress(self.map[index_offset:])
+            index = IndexUnpickler(io.BytesIO(raw_index), encoding='bytes').load()
+            self.entries = dict(normalize_entry(name, parts, key) for name, parts in index.items())
+        except Exception as e:
+            self.close()
+            if isinstance(e, RpaError):
+                raise
+            raise RpaError(f"Cannot read the index of {path}: {e}") from e
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if getattr(self, 'map', None) is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def names(self, patterns=None):
+        """Nombres de las entradas, o solo los que coinciden con alguno de los patrones glob."""
+        names = sorted(self.entries)
+        if patterns:
+            names = [name for name in names if any(fnmatch.fnmatch(name.lower(), pattern.lower()) for pattern in patterns)]
+        return names
+
+    def size(self, name):
+        return sum(len(prefix) + length for _, length, prefix in self.entries[name])
+
+    def iter_chunks(self, name, chunk_size=CHUNK_SIZE):
+        """Contenido de una entrada en trozos de como mucho chunk_size bytes."""
+        for offset, length, prefix in self.entries[name]:
+            if prefix:
+                yield prefix
+            end = offset + length
+            if end > len(self.map):
+                raise RpaError(f"Entry {name!r} is truncated")
+            for start in range(offset, end, chunk_size):
+                yield self.map[start:min(start + chunk_size, end)]
+
+    def read(self, name):
+        return b''.join(self.iter_chunks(name))
+
+    def extract(self, name, destination):
+        """Escribe una entrada bajo destination (mediante un temporal). Devuelve los bytes escritos."""
+        path = safe_path(destination, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        written = 0
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            for chunk in self.iter_chunks(name):
+                file.write(chunk)
+                written += len(chunk)
+        os.replace(temp_path, path)
+        return written
+
+def extract_archive(path, destination=None, patterns=SCRIPT_PATTERNS, workers=4, backup=False, progress_callback=None):
+    """Extrae del .rpa las entradas que coinciden con patterns (None = todas) usando varios hilos.
+
+    Por defecto se extrae junto al archivo y el .rpa no se toca; con backup se
+    renombra a .rpa-backup, como hacía el botón UnRpa. progress_callback(hechas,
+    total) se llama tras cada entrada. Devuelve un informe con lo extraído, lo
+    saltado y la velocidad.
+    """
+    destination = destination or os.path.dirname(os.path.abspath(path))
+    start = time.perf_counter()
+    with RpaArchive(path) as archive:
+        names = archive.names(patterns)
+        selected = set(names)
+        skipped = [name for name in archive.entries if name not in selected]
+        done = [0]
+        lock = threading.Lock()
+
+        def extract(name):
+            written = archive.extract(name, destination)
+            with lock:
+                done[0] += 1
+                if progress_callback:
+                    progress_callback(done[0], len(names))
+            return written
+
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            written = sum(executor.map(extract, names))
+        skipped_bytes = sum(archive.size(name) for name in skipped)
+        version = archive.version
+
+    backup_path = None
+    if backup:
+        backup_path = os.path.splitext(path)[0] + '.rpa-backup'
+        os.rename(path, backup_path)
+    seconds = time.perf_counter() - start
+    return {
+        'archive': path,
+        'version': version,
+        'destination': destination,
+        'files': len(names),
+        'bytes': written,
+        'skipped_files': len(skipped),
+        'skipped_bytes': skipped_bytes,
+        'seconds': seconds,
+        'mb_per_sec': written / 1024 / 1024 / seconds if seconds else 0.0,
+        'backup': backup_path,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="List or extract Ren'Py .rpa archives without unrpa")
+    parser.add_argument("archives", nargs="+")
+    parser.add_argument("--list", action="store_true", help="Only list the entries")
+    parser.add_argument("--pattern", action="append", help=f"Glob of entries to extract (default {' '.join(SCRIPT_PATTERNS)}); repeatable")
+    parser.add_argument("--all", action="store_true", help="Extract every entry, including images and audio")
+    parser.add_argument("--output", help="Destination folder (default: next to the archive)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--backup", action="store_true", help="Rename the archive to .rpa-backup after extracting")
+    args = parser.parse_args()
+
+    patterns = None if args.all else (args.pattern or SCRIPT_PATTERNS)
+    try:
+        for archive_path in args.archives:
+            if args.list:
+                with RpaArchive(archive_path) as archive:
+                    for name in archive.names(patterns):
+                        print(f"{archive.size(name):>12}  {name}")
+            else:
+                print(json.dumps(extract_archive(archive_path, args.output, patterns, args.workers, args.backup)))
+    except (RpaError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,26 @@
+# Paridad entre los motores PyTorch y ONNX Runtime (python -m pytest)
+# Se salta si faltan optimum u onnxruntime; la primera vez descarga y exporta el modelo.
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("optimum.onnxruntime")
+
+from inference_backends import compare_backends
+from main import make_generation_kwargs
+
+MODEL = "Helsinki-NLP/opus-mt-en-es"
+TEXTS = [
+    "Hello, how are you?",
+    "I don't think we should go in there.",
+    "The door is locked. Maybe the key is upstairs.",
+    "Thank you for everything.",
+]
+
+@pytest.mark.parametrize("num_beams", [1, 4], ids=["greedy", "beam"])
+def test_onnx_matches_torch(num_beams):
+    generation_kwargs = make_generation_kwargs(128, num_beams, 1.0, 1.0, 1.0, 0)
+    results = compare_backends(MODEL, TEXTS, generation_kwargs=generation_kwargs)
+    assert results['onnx']['outputs'] == results['torch']['outputs']
+    assert results['onnx']['different_segments'] == 0
@@ -0,0 +1,82 @@
+# Diario de traducción: reanudar tras un corte y escribir el resultado de forma atómica (python -m pytest)
+import os
+import pytest
+import journal
+from journal import finalize_journal, journal_path_for, open_journal, source_signature, write_record
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "script.rpy"
+    path.write_text("a\nb\nc\n", encoding='utf-8')
+    return str(path)
+
+def test_resume_counts_finished_records(source):
+    signature = source_signature(source)
+    log, lines_done = open_journal(source, signature)
+    assert lines_done == 0
+    write_record(log, 2, ["A\n", "B\n"])
+    log.close()
+    log, lines_done = open_journal(source, signature)
+    log.close()
+    assert lines_done == 2
+
+def test_torn_record_is_truncated(source):
+    signature = source_signature(source)
+    log, _ = open_journal(source, signature)
+    write_record(log, 1, ["A\n"])
+    valid_size = log.tell()
+    # Cierre inesperado a mitad de escribir la segunda entrada
+    log.write(b'{"lines_in": 1, "outp')
+    log.close()
+    log, lines_done = open_journal(source, signature)
+    log.close()
+    assert lines_done == 1
+    assert os.path.getsize(journal_path_for(source)) == valid_size
+
+def test_changed_source_restarts(source):
+    log, _ = open_journal(source, source_signature(source))
+    write_record(log, 3, ["A\n", "B\n", "C\n"])
+    log.close()
+    with open(source, 'a', encoding='utf-8') as file:
+        file.write("d\n")
+    log, lines_done = open_journal(source, source_signature(source))
+    log.close()
+    assert lines_done == 0
+
+def test_finalize_replaces_source_and_removes_journal(source):
+    log, _ = open_journal(source, source_signature(source))
+    write_record(log, 2, ["A\n", "B\n"])
+    write_record(log, 1, ["C\n"])
+    log.close()
+    finalize_journal(source)
+    with open(source, encoding='utf-8') as file:
+        assert file.read() == "A\nB\nC\n"
+    assert not os.path.exists(journal_path_for(source))
+    assert not os.path.exists(source + journal.TEMP_SUFFIX)
+
+def test_failed_finalize_leaves_source_untouched(source, monkeypatch):
+    log, _ = open_journal(source, source_signature(source))
+    write_record(log, 3, ["A\n", "B\n", "C\n"])
+    log.close()
+
+    def fail(*args):
+        raise OSError("disk full")
+    monkeypatch.setattr(journal.os, 'replace', fail)
+    with pytest.raises(OSError):
+        finalize_journal(source)
+    with open(source, encoding='utf-8') as file:
+        assert file.read() == "a\nb\nc\n"
+    # El diario sigue ahí para reanudar
+    assert os.path.exists(journal_path_for(source))
+
+def test_copy_mode_keeps_the_journal_out_of_the_source_tree(source, tmp_path):
+    output = str(tmp_path / "out" / "script.rpy")
+    log, _ = open_journal(source, source_signature(source), output)
+    write_record(log, 3, ["A\n", "B\n", "C\n"])
+    log.close()
+    assert not os.path.exists(journal_path_for(source))
+    assert os.path.exists(journal_path_for(source, output))
+    finalize_journal(source, output)
+    with open(output, encoding='utf-8') as file:
+        assert file.read() == "A\nB\nC\n"
+    assert sorted(os.listdir(tmp_path)) == ["out", "script.rpy"]
@@ -0,0 +1,13 @@
+# Casos de regresión del filtro de líneas con corchetes o llaves (python -m pytest)
+from main import parse_segments
+
+def entry_texts(lines, masking=True):
+    return [entry['text'] for entry in parse_segments(lines, masking)[1]]
+
+def test_python_brackets_are_not_translated():
+    assert entry_texts(['    $ persistent.flags["ending_seen"] = True\n']) == []
+    assert entry_texts(['    $ inventory = ["old sword", "rusty shield"]\n']) == []
+
+def test_markup_inside_dialogue_is_translated():
+    assert entry_texts(['    e "Hello [player], {b}welcome{/b}!"\n']) == ['Hello [player], {b}welcome{/b}!']
+    assert entry_texts(['    e "Hello [player]!"\n'], masking=False) == []
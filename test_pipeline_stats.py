@@ -0,0 +1,18 @@
+# Estadísticas del pipeline (python -m pytest)
+from pipeline_stats import PipelineStats
+
+def test_prometheus_labels_keep_unicode_and_escape_quotes():
+    stats = PipelineStats()
+    stats.file_padding['tl/diálogo "final".rpy'] = [3, 4]
+    text = stats.to_prometheus()
+    assert 'traductor_file_padding_efficiency{file="tl/diálogo \\"final\\".rpy"} 0.750000' in text
+    assert '\\u' not in text
+
+def test_file_padding_forgets_counted_texts():
+    stats = PipelineStats()
+    stats.record_padding(["short", "a longer text"], [[1, 1, 0], [1, 1, 1]])
+    stats.count_file_padding("a.rpy", ["short", "a longer text"])
+    stats.count_file_padding("b.rpy", ["short"])
+    assert stats.text_padding == {}
+    assert stats.snapshot()['files']['a.rpy']['padding_efficiency'] == 5 / 6
+    assert stats.snapshot()['files']['b.rpy']['padded_tokens'] == 0
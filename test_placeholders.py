@@ -0,0 +1,29 @@
+# Enmascarado del marcado (python -m pytest)
+from placeholders import mask_markup, unmask_markup
+
+def test_round_trip():
+    masked, runs = mask_markup("Hello [player], {b}welcome{/b}!")
+    assert masked == "Hello #1, #2welcome#3!"
+    assert unmask_markup("¡Hola #1, #2bienvenido#3!", runs) == "¡Hola [player], {b}bienvenido{/b}!"
+
+def test_space_after_hash_is_accepted():
+    _, runs = mask_markup("Hi [name]")
+    assert unmask_markup("Hola # 1", runs) == "Hola [name]"
+
+def test_variables_may_move():
+    _, runs = mask_markup("[name] has [count] coins")
+    assert unmask_markup("#2 monedas tiene #1", runs) == "[count] monedas tiene [name]"
+
+def test_tags_must_keep_their_order():
+    _, runs = mask_markup("{i}very{/i} good")
+    assert unmask_markup("muy #2bueno#1", runs) is None
+
+def test_lost_or_duplicated_sentinels_fail():
+    _, runs = mask_markup("Hi [a] and [b]")
+    assert unmask_markup("Hola #1", runs) is None
+    assert unmask_markup("Hola #1 y #1", runs) is None
+    assert unmask_markup("Hola #1 y #3", runs) is None
+
+def test_text_without_markup_or_with_sentinels_is_not_masked():
+    assert mask_markup("Plain text") is None
+    assert mask_markup("Room #1 is [state]") is None
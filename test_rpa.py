@@ -0,0 +1,53 @@
+# Lectura de archivos .rpa (python -m pytest)
+import os
+import zlib
+import pickle
+import pytest
+from rpa import RpaArchive, RpaError, extract_archive, parse_header, safe_path
+
+def write_archive(path, files, key=0x42424242):
+    """Archivo RPA-3.0 mínimo con los archivos dados (nombre -> bytes)."""
+    header_size = 34
+    data = b''
+    index = {}
+    for name, content in files.items():
+        index[name] = [((header_size + len(data)) ^ key, len(content) ^ key, b'')]
+        data += content
+    header = f"RPA-3.0 {header_size + len(data):016x} {key:08x}\n".encode('ascii')
+    assert len(header) == header_size
+    with open(path, 'wb') as file:
+        file.write(header + data + zlib.compress(pickle.dumps(index, protocol=2)))
+
+def test_parse_header():
+    assert parse_header(b"RPA-3.0 0000000000000100 42424242") == ('RPA-3.0', 0x100, 0x42424242)
+    assert parse_header(b"RPA-2.0 0000000000000100") == ('RPA-2.0', 0x100, 0)
+    with pytest.raises(RpaError):
+        parse_header(b"ZIP 1")
+    with pytest.raises(RpaError):
+        parse_header(b"")
+
+def test_safe_path_rejects_traversal(tmp_path):
+    destination = str(tmp_path)
+    assert safe_path(destination, "script/a.rpy") == os.path.join(destination, "script", "a.rpy")
+    assert safe_path(destination, "/abs/a.rpy") == os.path.join(destination, "abs", "a.rpy")
+    for name in ("../evil.rpy", "script/../../evil.rpy", "..\\evil.rpy"):
+        with pytest.raises(RpaError):
+            safe_path(destination, name)
+
+def test_read_and_extract_scripts_only(tmp_path):
+    archive_path = str(tmp_path / "archive.rpa")
+    write_archive(archive_path, {"script.rpy": b'label start:\n', "images/bg.png": b'\x89PNG'})
+    with RpaArchive(archive_path) as archive:
+        assert archive.read("script.rpy") == b'label start:\n'
+    report = extract_archive(archive_path)
+    assert report['files'] == 1 and report['skipped_files'] == 1
+    assert (tmp_path / "script.rpy").read_bytes() == b'label start:\n'
+
+def test_backup_only_renames_the_archive(tmp_path):
+    folder = tmp_path / "game.rpa.d"
+    folder.mkdir()
+    archive_path = str(folder / "archive.rpa")
+    write_archive(archive_path, {"script.rpy": b'x'})
+    report = extract_archive(archive_path, backup=True)
+    assert report['backup'] == str(folder / "archive.rpa-backup")
+    assert os.path.exists(report['backup']) and not os.path.exists(archive_path)
@@ -0,0 +1,22 @@
+# Lotes por presupuesto de tokens (python -m pytest)
+from main import batch_token_cost, estimate_tokens, make_token_batches
+
+def test_batches_stay_under_the_budget():
+    texts = ["word " * (i % 30 + 1) for i in range(100)]
+    batches = make_token_batches(texts, 16, 4000, num_beams=4, max_length=128)
+    assert sorted(text for batch in batches for text in batch) == sorted(texts)
+    for batch in batches:
+        assert len(batch) <= 16
+        width = max(estimate_tokens(text) for text in batch)
+        assert len(batch) == 1 or batch_token_cost(len(batch), width, 4, 128) <= 4000
+
+def test_oversized_text_gets_its_own_batch():
+    texts = ["x" * 4000, "short", "tiny"]
+    batches = make_token_batches(texts, 16, 500, num_beams=1, max_length=64)
+    assert batches[0] == ["x" * 4000]
+    assert sorted(batches[1]) == ["short", "tiny"]
+
+def test_chunks_keep_their_order():
+    texts = ["a", "bbbbbbbb", "cc", "dddddddddddd"]
+    batches = make_token_batches(texts, 16, 10 ** 6, chunk_size=2)
+    assert batches == [["bbbbbbbb", "a"], ["dddddddddddd", "cc"]]
@@ -0,0 +1,23 @@
+# Memoria de traducción: claves por modelo y ajustes, y expulsión LRU (python -m pytest)
+import itertools
+import translation_memory
+from translation_memory import TranslationMemory
+
+def test_settings_and_model_are_part_of_the_key(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "tm.db"))
+    memory.store({"Hello": "Hola"}, "model-a", {'num_beams': 4})
+    assert memory.lookup(["Hello"], "model-a", {'num_beams': 4}) == {"Hello": "Hola"}
+    assert memory.lookup(["Hello"], "model-a", {'num_beams': 2}) == {}
+    assert memory.lookup(["Hello"], "model-b", {'num_beams': 4}) == {}
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    clock = itertools.count(1)
+    monkeypatch.setattr(translation_memory.time, 'time', lambda: next(clock))
+    memory = TranslationMemory(str(tmp_path / "tm.db"), max_entries=2)
+    memory.store({"one": "uno"}, "model", {})
+    memory.store({"two": "dos"}, "model", {})
+    # Usar "one" lo hace más reciente que "two", que es el que sale al guardar "three"
+    assert memory.lookup(["one"], "model", {}) == {"one": "uno"}
+    memory.store({"three": "tres"}, "model", {})
+    assert memory.size() == 2
+    assert memory.lookup(["one", "two", "three"], "model", {}) == {"one": "uno", "three": "tres"}
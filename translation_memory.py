@@ -0,0 +1,142 @@
+#!/usr/bin/python
+# translation_memory.py
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_MEMORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "translation_memory.db")
+
+class TranslationMemory:
+    """Memoria de traducción en disco (SQLite) con expulsión LRU.
+
+    Cada entrada se identifica por el texto original, el nombre del modelo y los
+    parámetros de decodificación, así que cambiar un slider no reutiliza
+    traducciones hechas con otros ajustes.
+    """
+
+    def __init__(self, path=DEFAULT_MEMORY_PATH, max_entries=200000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS memory ("
+            "key TEXT PRIMARY KEY, model TEXT, settings TEXT, source TEXT, "
+            "translation TEXT, last_used REAL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS memory_last_used ON memory (last_used)")
+        self.connection.commit()
+
+    @staticmethod
+    def settings_key(settings):
+        return json.dumps(settings, sort_keys=True)
+
+    @staticmethod
+    def make_key(source, model_name, settings_key):
+        return hashlib.sha1(f"{model_name}\0{settings_key}\0{source}".encode('utf-8')).hexdigest()
+
+    def lookup(self, texts, model_name, settings):
+        """Devuelve un diccionario texto -> traducción con los textos que ya están en memoria."""
+        settings_key = self.settings_key(settings)
+        keys = {self.make_key(text, model_name, settings_key): text for text in texts}
+        found = {}
+        found_keys = []
+        with self.lock:
+            key_list = list(keys)
+            for start in range(0, len(key_list), 500):
+                chunk = key_list[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self.connection.execute(
+                    f"SELECT key, translation FROM memory WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, translation in rows:
+                    found[keys[key]] = translation
+                    found_keys.append(key)
+            if found_keys:
+                now = time.time()
+                self.connection.executemany(
+                    "UPDATE memory SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found_keys]
+                )
+                self.connection.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def store(self, translations, model_name, settings):
+        """Guarda las traducciones (texto -> traducción) y expulsa las entradas más antiguas si hace falta."""
+        settings_key = self.settings_key(settings)
+        now = time.time()
+        rows = [
+            (self.make_key(source, model_name, settings_key), model_name, settings_key, source, translation, now)
+            for source, translation in translations.items()
+        ]
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO memory VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.evict()
+            self.connection.commit()
+
+    def evict(self):
+        excess = self.size() - self.max_entries
+        if excess > 0:
+            self.connection.execute(
+                "DELETE FROM memory WHERE key IN (SELECT key FROM memory ORDER BY last_used ASC LIMIT ?)",
+                (excess,)
+            )
+
+    def size(self):
+        return self.connection.execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+
+    def export_to(self, file_path):
+        """Exporta la memoria a un archivo JSON Lines. Devuelve el número de entradas exportadas."""
+        count = 0
+        with self.lock, open(file_path, 'w', encoding='utf-8') as file:
+            for model, settings, source, translation, last_used in self.connection.execute(
+                "SELECT model, settings, source, translation, last_used FROM memory ORDER BY last_used"
+            ):
+                file.write(json.dumps({
+                    'model': model,
+                    'settings': json.loads(settings),
+                    'source': source,
+                    'translation': translation,
+                    'last_used': last_used,
+                }, ensure_ascii=False) + '\n')
+                count += 1
+        return count
+
+    def import_from(self, file_path):
+        """Importa entradas desde un archivo JSON Lines exportado. Devuelve el número de entradas importadas."""
+        rows = []
+        with open(file_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                settings_key = self.settings_key(entry['settings'])
+                rows.append((
+                    self.make_key(entry['source'], entry['model'], settings_key),
+                    entry['model'],
+                    settings_key,
+                    entry['source'],
+                    entry['translation'],
+                    entry.get('last_used', time.time()),
+                ))
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO memory VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.evict()
+            self.connection.commit()
+        return len(rows)
+
+    def stats(self):
+        with self.lock:
+            size = self.size()
+        return {'entries': size, 'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
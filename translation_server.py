@@ -0,0 +1,354 @@
+#!/usr/bin/python
+# translation_server.py
+# Servicio local de traducción: un solo proceso con los modelos cargados al que se conectan
+# la interfaz, el CLI y model_installer.translate_text. Las peticiones que llegan a la vez de
+# distintos clientes se juntan en el mismo lote antes de llamar a model.generate.
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from pipeline_stats import PipelineStats
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_SERVER_URL = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+# Si está definida, model_installer.translate_text usa el servicio en lugar de cargar el modelo
+SERVER_ENV_VAR = "TRADUCTOR_SERVER"
+
+def model_key(model_name, quantized):
+    return f"{model_name}:int8" if quantized else model_name
+
+class ServerStats:
+    """Contadores del servicio: cola, peticiones y tamaño de los lotes que llegan al modelo."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queue_depth = 0
+        self.requests = 0
+        self.segments = 0
+        self.batches = 0
+        self.batch_segments = 0
+        self.merged_batches = 0
+        self.wait_seconds = 0.0
+        self.batch_sizes = {}
+
+    def submitted(self, count):
+        with self.lock:
+            self.requests += 1
+            self.segments += count
+            self.queue_depth += count
+
+    def taken(self, count):
+        with self.lock:
+            self.queue_depth -= count
+
+    def batch(self, size, requests):
+        with self.lock:
+            self.batches += 1
+            self.batch_segments += size
+            self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+            if requests > 1:
+                self.merged_batches += 1
+
+    def answered(self, seconds):
+        with self.lock:
+            self.wait_seconds += seconds
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'queue_depth': self.queue_depth,
+                'requests': self.requests,
+                'segments': self.segments,
+                'batches': self.batches,
+                'mean_batch_size': self.batch_segments / self.batches if self.batches else 0.0,
+                # Lotes con segmentos de más de una petición
+                'merged_batches': self.merged_batches,
+                'mean_latency_ms': self.wait_seconds / self.requests * 1000 if self.requests else 0.0,
+                'batch_sizes': dict(sorted(self.batch_sizes.items())),
+            }
+
+class ModelWorker(threading.Thread):
+    """Hilo dueño de un modelo: junta las peticiones pendientes en micro-lotes y las traduce.
+
+    Tras recibir una petición espera como mucho window segundos a que lleguen
+    más (hasta max_batch segmentos). Solo se mezclan peticiones con los mismos
+    parámetros de generación, y los textos repetidos se traducen una sola vez.
+    """
+
+    def __init__(self, tokenizer, model, device, stats, max_batch=64, window=0.01):
+        super().__init__(daemon=True)
+        self.tokenizer = tokenizer
+        self.model = model
+        self.device = device
+        self.stats = stats
+        self.max_batch = max_batch
+        self.window = window
+        self.queue = queue.Queue()
+        # Tiempos y contadores de generate_splitting (lotes partidos por falta de memoria)
+        self.pipeline_stats = PipelineStats()
+
+    def submit(self, texts, generation_kwargs):
+        future = Future()
+        self.stats.submitted(len(texts))
+        key = json.dumps(generation_kwargs, sort_keys=True)
+        self.queue.put((texts, generation_kwargs, key, time.monotonic(), future))
+        return future
+
+    def collect(self):
+        requests = [self.queue.get()]
+        size = len(requests[0][0])
+        deadline = time.monotonic() + self.window
+        while size < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            requests.append(request)
+            size += len(request[0])
+        self.stats.taken(size)
+        return requests
+
+    def translate_group(self, group):
+        """Traduce los textos de un grupo; un micro-lote que no cabe en memoria se parte en lugar de fallar entero."""
+        from main import generate_splitting, make_batches
+        generation_kwargs = group[0][1]
+        texts = list(dict.fromkeys(text for request in group for text in request[0]))
+        translations = {}
+        max_rows = None
+        for batch in make_batches(texts, self.max_batch):
+            results, max_rows = generate_splitting(batch, self.tokenizer, self.model, self.device, generation_kwargs,
+                                                   self.pipeline_stats, max_rows)
+            if isinstance(results, Exception):
+                raise results
+            translations.update(zip(batch, results))
+            self.stats.batch(len(batch), len(group))
+        return translations
+
+    def run(self):
+        while True:
+            groups = {}
+            for request in self.collect():
+                groups.setdefault(request[2], []).append(request)
+
+            for group in groups.values():
+                try:
+                    translations = self.translate_group(group)
+                except Exception as e:
+                    for request in group:
+                        request[4].set_exception(e)
+                    continue
+                now = time.monotonic()
+                for texts, _, _, queued_at, future in group:
+                    self.stats.answered(now - queued_at)
+                    future.set_result([translations[text] for text in texts])
+
+class TranslationService:
+    """Modelos cargados (uno por nombre y variante) con su hilo de micro-lotes."""
+
+    def __init__(self, device="cuda", max_batch=64, window=0.01, backend="torch"):
+        self.device = device
+        self.backend = backend
+        self.max_batch = max_batch
+        self.window = window
+        self.stats = ServerStats()
+        self.workers = {}
+        # Modelos cargándose: clave -> Future con su ModelWorker
+        self.loading = {}
+        self.lock = threading.Lock()
+
+    def worker_for(self, model_name, quantized=False):
+        """Devuelve el hilo del modelo, cargándolo si hace falta.
+
+        La carga se hace fuera del candado, así las peticiones a los modelos ya
+        cargados no esperan; quien pide un modelo que se está cargando espera a
+        esa misma carga.
+        """
+        key = model_key(model_name, quantized)
+        with self.lock:
+            if key in self.workers:
+                return self.workers[key]
+            loading = self.loading.get(key)
+            if loading is None:
+                loading = self.loading[key] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return loading.result()
+
+        from main import load_translation_model
+        device = "cpu" if quantized else self.device
+        try:
+            tokenizer, model = load_translation_model(model_name, device, quantized, backend=self.backend)
+        except Exception as e:
+            with self.lock:
+                del self.loading[key]
+            loading.set_exception(e)
+            raise
+        worker = ModelWorker(tokenizer, model, device, self.stats, self.max_batch, self.window)
+        worker.start()
+        with self.lock:
+            self.workers[key] = worker
+            del self.loading[key]
+        loading.set_result(worker)
+        return worker
+
+    def translate(self, texts, model_name, generation_kwargs, quantized=False):
+        return self.worker_for(model_name, quantized).submit(texts, generation_kwargs).result()
+
+    def snapshot(self):
+        stats = self.stats.snapshot()
+        with self.lock:
+            workers = dict(self.workers)
+        stats['models'] = sorted(workers)
+        stats['loading'] = sorted(self.loading)
+        stats['oom_splits'] = sum(worker.pipeline_stats.counters['oom_splits'] for worker in workers.values())
+        return stats
+
+class TranslationRequestHandler(BaseHTTPRequestHandler):
+    server_version = "Traductor/1.0"
+
+    def send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self.send_json(200, {'status': 'ok'})
+        elif self.path == '/stats':
+            self.send_json(200, self.server.service.snapshot())
+        else:
+            self.send_json(404, {'error': f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            service = self.server.service
+            if self.path == '/load':
+                service.worker_for(request['model'], request.get('quantized', False))
+                self.send_json(200, {'models': sorted(service.workers)})
+            elif self.path == '/translate':
+                translations = service.translate(
+                    request['texts'], request['model'], request.get('generation', {}), request.get('quantized', False)
+                )
+                self.send_json(200, {'translations': translations})
+            else:
+                self.send_json(404, {'error': f"Unknown path {self.path}"})
+        except Exception as e:
+            self.send_json(500, {'error': str(e), 'type': type(e).__name__})
+
+    def log_message(self, format, *args):
+        # Una línea por petición ensuciaría la consola; los números están en /stats
+        pass
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, device="cuda", max_batch=64, window=0.01, preload=(), backend="torch"):
+    service = TranslationService(device, max_batch, window, backend)
+    for model_name in preload:
+        service.worker_for(model_name)
+    server = ThreadingHTTPServer((host, port), TranslationRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    print(f"Translation server listening on http://{host}:{port} (device {device}, backend {backend}, batch {max_batch}, window {window * 1000:.0f}ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+class TranslationClient:
+    """Cliente del servicio. Tiene la misma interfaz que CpuTranslationPool (translate_batches).
+
+    Se mantienen varias peticiones en vuelo para que el servicio siempre tenga
+    trabajo que juntar con el de otros clientes.
+    """
+
+    def __init__(self, url=DEFAULT_SERVER_URL, model_name="Helsinki-NLP/opus-mt-en-es", quantized=False, in_flight=4, timeout=600):
+        self.url = url.rstrip('/')
+        self.model_name = model_name
+        self.name_or_path = model_key(model_name, quantized)
+        self.quantized = quantized
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=in_flight)
+
+    def request(self, path, body=None):
+        data = None if body is None else json.dumps(body, ensure_ascii=False).encode('utf-8')
+        request = urllib.request.Request(self.url + path, data=data, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(json.loads(e.read()).get('error', str(e))) from None
+
+    def available(self):
+        try:
+            return self.request('/health')['status'] == 'ok'
+        except OSError:
+            return False
+
+    def load(self):
+        """Pide al servicio que cargue el modelo ahora y no con la primera traducción."""
+        self.request('/load', {'model': self.model_name, 'quantized': self.quantized})
+        return self
+
+    def translate(self, texts, generation_kwargs=None):
+        return self.request('/translate', {
+            'model': self.model_name,
+            'quantized': self.quantized,
+            'texts': list(texts),
+            'generation': generation_kwargs or {},
+        })['translations']
+
+    def stats(self):
+        return self.request('/stats')
+
+    def translate_batches(self, batches, generation_kwargs, should_stop=None):
+        """Envía los lotes al servicio y devuelve (lote, traducciones o excepción) en orden."""
+        futures = [self.executor.submit(self.translate, batch, generation_kwargs) for batch in batches]
+        try:
+            for batch, future in zip(batches, futures):
+                if should_stop and should_stop():
+                    return
+                try:
+                    yield batch, future.result()
+                except Exception as e:
+                    yield batch, e
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+if __name__ == '__main__':
+    from inference_backends import BACKENDS
+    parser = argparse.ArgumentParser(description="Local translation server shared by the GUI, the CLI and scripts")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--device", default="cuda", help="cuda or cpu")
+    parser.add_argument("--backend", default="torch", choices=sorted(BACKENDS), help="Inference backend")
+    parser.add_argument("--max-batch", type=int, default=64, help="Most segments sent to model.generate at once")
+    parser.add_argument("--window-ms", type=float, default=10.0, help="How long to wait for other clients before running a batch")
+    parser.add_argument("--preload", nargs="*", default=["Helsinki-NLP/opus-mt-en-es"], help="Models loaded at startup")
+    parser.add_argument("--stats", action="store_true", help="Print the stats of a running server and exit")
+    args = parser.parse_args()
+
+    if args.stats:
+        print(json.dumps(TranslationClient(f"http://{args.host}:{args.port}").stats(), indent=2))
+        sys.exit(0)
+    serve(args.host, args.port, args.device, args.max_batch, args.window_ms / 1000, args.preload, args.backend)